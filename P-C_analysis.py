@@ -6,6 +6,7 @@ import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import matplotlib.ticker as ticker
 
+import pc_core
 
 plt.rcParams['font.sans-serif'] = ['SimHei']
 plt.rcParams['axes.unicode_minus'] = False
@@ -112,13 +113,10 @@ class DataVisualizer(tk.Tk):
             self.lbl_fluorescence.config(text=file_path)
 
     def read_file(self, file_path):
-        if file_path.endswith('.xlsx'):
-            return pd.read_excel(file_path)
-        else:
-            try:
-                return pd.read_csv(file_path, delim_whitespace=True, header=None, low_memory=False)
-            except Exception:
-                return pd.read_csv(file_path, sep=',', header=None, low_memory=False)
+        """
+        读取文件为 DataFrame，解析结果会缓存到磁盘，见 pc_core.load_matrix。
+        """
+        return pd.DataFrame(pc_core.load_matrix(file_path, dtype=np.float64))
 
     def plot_data(self):
         # 重置时间窗口列表
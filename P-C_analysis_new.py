@@ -1,15 +1,20 @@
+import functools
 import tkinter as tk
 from tkinter import filedialog, messagebox
-import pandas as pd
-import numpy as np
 import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
 import matplotlib.ticker as ticker
-from scipy.signal import butter, filtfilt, find_peaks
+
+import event_average
+import pc_core
+from lod_plot import DecimatedLine, MinMaxPyramid
+from tk_worker import BackgroundRunner, check_cancelled
 
 plt.rcParams['font.sans-serif'] = ['SimHei']
 plt.rcParams['axes.unicode_minus'] = False
 
+NEURON_POOL_SIZE = 8  # 同时显示的神经元子图数，滚动时复用这些子图
+
 
 class DataVisualizer(tk.Tk):
     def __init__(self):
@@ -22,10 +27,23 @@ class DataVisualizer(tk.Tk):
         self.time_window_patches = []  # 保存每个时间窗在各图上生成的patch对象（用于撤销）
         self.t_pressure = None  # 压力曲线时间轴
         self.t_fluo = None  # 荧光曲线时间轴
-        self.fluorescence_data = None  # 各神经元荧光数据，列表，每个元素为一维数组
+        self.fluorescence_data = None  # 各神经元荧光数据，(神经元, 采样点) 的 float32 数组
+        self.raw_fluorescence = None  # 未扣除基线的荧光数据，用于计算 ΔF/F
+        self.pressure_freq = None  # 当前绘图使用的压力采样频率
+        self.fluo_freq = None  # 当前绘图使用的荧光采样频率
+        self.baseline_window = None  # 当前绘图使用的荧光基线窗口（秒），None 表示未校正
+        self.baseline_approx = False  # 当前绘图是否使用近似基线
+        self.time_peaks = None  # 二阶差分检测峰对应的时间
         self.diff2_ax = None  # 二阶差分图，用于响应点击选择时间窗
         self.axes = None  # 所有子图的Axes列表
         self.canvas = None  # FigureCanvasTkAgg 对象
+        self.toolbar = None  # 缩放/平移工具栏
+        self.lod_lines = []  # 按显示范围降采样的压力曲线（需保持引用，回调才会生效）
+        self.neuron_axes = []  # 神经元子图池
+        self.neuron_lines = []  # 神经元子图池中的曲线
+        self.neuron_offset = 0  # 子图池第一个子图显示的神经元索引
+        self.background = None  # 不含时间窗 patch 的静态图像缓存，用于 blit 增量重绘
+        self.runner = BackgroundRunner(self)  # 读取与计算在后台线程执行
         self.create_widgets()
         self.protocol("WM_DELETE_WINDOW", self.on_closing)
 
@@ -69,7 +87,9 @@ class DataVisualizer(tk.Tk):
 
         # 绘图按钮
         btn_plot = tk.Button(control_frame, text="绘制图形", command=self.plot_data)
-        btn_plot.grid(row=5, column=0, columnspan=2, padx=5, pady=10)
+        btn_plot.grid(row=5, column=0, padx=5, pady=10)
+        btn_cancel = tk.Button(control_frame, text="取消", command=self.cancel_task)
+        btn_cancel.grid(row=5, column=1, padx=5, pady=10, sticky="w")
 
         # 保存数据按钮
         btn_save = tk.Button(control_frame, text="保存数据", command=self.save_data)
@@ -79,7 +99,42 @@ class DataVisualizer(tk.Tk):
         btn_undo = tk.Button(control_frame, text="撤销操作", command=self.undo_time_window)
         btn_undo.grid(row=6, column=1, padx=5, pady=5, sticky="w")
 
+        # 自动生成时间窗：以二阶差分检测峰为起点，按不应期/合并规则筛选
+        lbl_refractory = tk.Label(control_frame, text="不应期(秒，空则等于时间窗口):")
+        lbl_refractory.grid(row=7, column=0, padx=5, pady=5, sticky="w")
+        self.entry_refractory = tk.Entry(control_frame, width=10)
+        self.entry_refractory.grid(row=7, column=1, padx=5, pady=5, sticky="w")
+
+        lbl_merge_gap = tk.Label(control_frame, text="峰合并间隔(秒):")
+        lbl_merge_gap.grid(row=8, column=0, padx=5, pady=5, sticky="w")
+        self.entry_merge_gap = tk.Entry(control_frame, width=10)
+        self.entry_merge_gap.grid(row=8, column=1, padx=5, pady=5, sticky="w")
+        self.entry_merge_gap.insert(0, "0")
+
+        btn_auto = tk.Button(control_frame, text="由检测峰自动生成时间窗", command=self.auto_time_windows)
+        btn_auto.grid(row=9, column=0, columnspan=2, padx=5, pady=5)
+
+        # 荧光基线校正：分段前扣除每个神经元的滑动中值基线
+        lbl_baseline = tk.Label(control_frame, text="基线窗口(秒，空则不校正):")
+        lbl_baseline.grid(row=10, column=0, padx=5, pady=5, sticky="w")
+        self.entry_baseline = tk.Entry(control_frame, width=10)
+        self.entry_baseline.grid(row=10, column=1, padx=5, pady=5, sticky="w")
+        self.approx_baseline = tk.BooleanVar(value=False)
+        chk_approx = tk.Checkbutton(control_frame, text="近似基线(更快)", variable=self.approx_baseline)
+        chk_approx.grid(row=11, column=0, columnspan=2, padx=5, pady=5, sticky="w")
+
+        # 保存时以时间窗起点前的一段为基线计算 ΔF/F 触发平均，写入汇总表
+        lbl_pre = tk.Label(control_frame, text="ΔF/F基线(秒，空则不计算):")
+        lbl_pre.grid(row=12, column=0, padx=5, pady=5, sticky="w")
+        self.entry_pre = tk.Entry(control_frame, width=10)
+        self.entry_pre.grid(row=12, column=1, padx=5, pady=5, sticky="w")
+
         # 创建滚动显示区域（包含横向和纵向滚动条）
+        # 状态栏：时间窗记录等提示不再弹窗，便于连续标注
+        self.status_var = tk.StringVar(value="就绪")
+        status_bar = tk.Label(self, textvariable=self.status_var, anchor="w", relief="sunken")
+        status_bar.pack(side="bottom", fill="x")
+
         self.plot_container = tk.Frame(self)
         self.plot_container.pack(side="top", fill="both", expand=True)
 
@@ -92,6 +147,14 @@ class DataVisualizer(tk.Tk):
         self.plot_canvas.configure(xscrollcommand=self.plot_h_scrollbar.set)
         self.plot_h_scrollbar.pack(side="bottom", fill="x")
 
+        # 神经元滚动条：只切换子图池中显示的神经元，不创建新的子图
+        neuron_frame = tk.Frame(self.plot_container)
+        neuron_frame.pack(side="left", fill="y")
+        self.lbl_neuron_range = tk.Label(neuron_frame, text="神经元", width=12)
+        self.lbl_neuron_range.pack(side="top")
+        self.neuron_scrollbar = tk.Scrollbar(neuron_frame, orient="vertical", command=self.scroll_neurons)
+        self.neuron_scrollbar.pack(side="top", fill="y", expand=True)
+
         self.plot_canvas.pack(side="left", fill="both", expand=True)
 
         # 在 Canvas 中创建一个 Frame 用于放置图形
@@ -107,6 +170,7 @@ class DataVisualizer(tk.Tk):
         if file_path:
             self.pressure_file = file_path
             self.lbl_pressure.config(text=file_path)
+            self.apply_session_settings()
 
     def load_fluorescence_file(self):
         file_path = filedialog.askopenfilename(
@@ -115,31 +179,67 @@ class DataVisualizer(tk.Tk):
         if file_path:
             self.fluorescence_file = file_path
             self.lbl_fluorescence.config(text=file_path)
+            self.apply_session_settings()
 
-    def read_file(self, file_path):
+    def session_settings(self):
         """
-        读取文件并自动检测第一行是否为文字（表头）。
-        如果第一行中超过一半的值无法转换为数值，则认为该行为表头，并将其丢弃。
+        当前输入框中的处理参数，空或无效的值记为 None。
+
+        基线参数取当前绘图实际使用的值，而不是绘图后可能被修改过的输入框。
         """
-        if file_path.endswith('.xlsx'):
-            df = pd.read_excel(file_path, header=None)
-        else:
+        settings = {}
+        for key, entry in (('window_len', self.entry_time_window), ('refractory', self.entry_refractory),
+                           ('merge_gap', self.entry_merge_gap), ('pre_window', self.entry_pre)):
+            text = entry.get().strip()
             try:
-                df = pd.read_csv(file_path, delim_whitespace=True, header=None, low_memory=False)
-            except Exception:
-                df = pd.read_csv(file_path, sep=',', header=None, low_memory=False)
+                settings[key] = float(text) if text else None
+            except ValueError:
+                settings[key] = None
+        settings['baseline_window'] = self.baseline_window
+        settings['approx_baseline'] = self.baseline_approx
+        return settings
 
-        # 检查第一行是否为文本，超过半数无法转换则跳过
-        first_row = df.iloc[0]
-        numeric_first = pd.to_numeric(first_row, errors='coerce')
-        if numeric_first.isna().sum() >= len(numeric_first) / 2:
-            df = df.iloc[1:].reset_index(drop=True)
-        return df
+    def apply_session_settings(self):
+        """两个文件都已选择时在后台查找匹配的会话文件（需要计算文件哈希）。"""
+        if not self.pressure_file or not self.fluorescence_file:
+            return
+        pressure_file, fluorescence_file = self.pressure_file, self.fluorescence_file
+        self.runner.submit(lambda progress, cancel_event: pc_core.load_session(pressure_file, fluorescence_file),
+                           self.fill_session_settings, on_error=self.on_task_error)
 
-    def plot_data(self):
-        self.time_windows = []  # 重置已记录的时间窗数据
-        self.time_window_patches = []  # 清空之前保存的patch对象
+    def fill_session_settings(self, session):
+        """用会话文件中记录的参数填充输入框。"""
+        if session is None:
+            return
+        for key, entry in (('pressure_freq', self.entry_pressure_freq), ('fluo_freq', self.entry_fluo_freq),
+                           ('window_len', self.entry_time_window), ('refractory', self.entry_refractory),
+                           ('merge_gap', self.entry_merge_gap), ('baseline_window', self.entry_baseline),
+                           ('pre_window', self.entry_pre)):
+            if key not in session:
+                continue
+            entry.delete(0, tk.END)
+            if session[key] is not None:
+                entry.insert(0, f"{session[key]:g}")
+        self.approx_baseline.set(bool(session.get('approx_baseline', False)))
+        self.status_var.set(f"已找到会话文件，绘图后恢复 {len(session['time_windows'])} 个时间窗")
+
+    def save_session(self):
+        """时间窗变化后写入会话文件（荧光文件旁的 .session.json），失败时只在状态栏提示。"""
+        if self.fluorescence_data is None:
+            return
+        try:
+            pc_core.save_session(self.pressure_file, self.fluorescence_file, self.pressure_freq, self.fluo_freq,
+                                 self.time_windows, **self.session_settings())
+        except OSError as e:
+            self.status_var.set(f"会话文件保存失败: {e}")
 
+    def read_file(self, file_path):
+        """
+        读取文件为二维数值数组，自动检测分隔符与表头，见 pc_core.load_matrix。
+        """
+        return pc_core.load_matrix(file_path)
+
+    def plot_data(self):
         if not self.pressure_file or not self.fluorescence_file:
             messagebox.showwarning("文件未选择", "请先选择两个目标文件")
             return
@@ -155,75 +255,148 @@ class DataVisualizer(tk.Tk):
             fluo_freq = 40.0
             messagebox.showwarning("频率错误", "荧光采样频率输入无效，使用默认40Hz")
 
+        baseline_window = None
+        baseline_text = self.entry_baseline.get().strip()
+        if baseline_text:
+            try:
+                baseline_window = float(baseline_text) or None
+            except ValueError:
+                messagebox.showwarning("参数错误", "基线窗口输入无效，不做基线校正")
+
+        # 读取、滤波与峰值检测在后台线程中执行，完成后在界面线程中绘图
+        task = functools.partial(self.compute_plot_data, self.pressure_file, self.fluorescence_file,
+                                 pressure_freq, fluo_freq, baseline_window, self.approx_baseline.get())
+        self.runner.submit(task, self.render_plot_data, on_error=self.on_task_error,
+                           on_progress=self.status_var.set)
+        self.status_var.set("正在读取数据...")
+
+    @staticmethod
+    def compute_plot_data(pressure_file, fluorescence_file, pressure_freq, fluo_freq, baseline_window,
+                          approx_baseline, progress, cancel_event):
+        """后台线程中执行的计算部分，不访问任何 Tk 控件，返回绘图所需数据的字典。"""
+        progress("正在读取压力文件...")
         try:
-            df_pressure = self.read_file(self.pressure_file)
-            if df_pressure.shape[1] < 3:
-                messagebox.showerror("数据错误", "压力文件数据列数不足3列")
-                return
-            electrical_stim = pd.to_numeric(df_pressure.iloc[:, 1], errors='coerce').to_numpy()
-            pressure_coef = pd.to_numeric(df_pressure.iloc[:, 2], errors='coerce').to_numpy()
-            self.t_pressure = np.arange(len(electrical_stim)) / pressure_freq
+            electrical_stim, pressure_coef, t_pressure = pc_core.load_pressure(pressure_file, pressure_freq)
         except Exception as e:
-            messagebox.showerror("读取错误", f"读取压力文件失败:\n{e}")
-            return
+            raise RuntimeError(f"读取压力文件失败:\n{e}") from e
+        check_cancelled(cancel_event)
 
+        progress("正在读取荧光文件...")
         try:
-            df_fluorescence = self.read_file(self.fluorescence_file)
-            self.fluorescence_data = [
-                pd.to_numeric(df_fluorescence.iloc[:, i], errors='coerce').to_numpy()
-                for i in range(df_fluorescence.shape[1])
-            ]
-            self.t_fluo = np.arange(df_fluorescence.shape[0]) / fluo_freq
+            raw_fluorescence, t_fluo = pc_core.load_fluorescence(fluorescence_file, fluo_freq)
         except Exception as e:
-            messagebox.showerror("读取错误", f"读取荧光文件失败:\n{e}")
-            return
+            raise RuntimeError(f"读取荧光文件失败:\n{e}") from e
+        check_cancelled(cancel_event)
+
+        fluorescence_data = raw_fluorescence
+        if baseline_window:
+            progress("正在校正荧光基线...")
+            fluorescence_data = pc_core.correct_fluorescence_baseline(raw_fluorescence, fluo_freq, baseline_window,
+                                                                      approx=approx_baseline)
+            check_cancelled(cancel_event)
 
         # ----------------------------
         # 二阶差分压力数据处理部分
         # ----------------------------
-        filter_hz = 1.0
-        Wn = filter_hz / (pressure_freq / 2)
-        b, a = butter(3, Wn, btype='low')
-        filteredPressure = filtfilt(b, a, pressure_coef)
-        pressureDiff = np.diff(filteredPressure)
-        pressureDiff2 = np.diff(pressureDiff)
-        time_diff2 = np.arange(len(pressureDiff2)) / pressure_freq
+        progress("正在滤波并检测二阶差分峰值...")
+        filteredPressure, pressureDiff2, time_diff2 = pc_core.pressure_second_difference(pressure_coef, pressure_freq)
+        peaks, time_peaks = pc_core.detect_diff2_peaks(pressureDiff2, time_diff2)
+        check_cancelled(cancel_event)
+
+        # 降采样金字塔也在后台构建，绘图时直接使用
+        progress("正在准备绘图数据...")
+        traces = {
+            'stim': (t_pressure, electrical_stim),
+            'pressure': (t_pressure, pressure_coef),
+            'diff2': (time_diff2, pressureDiff2 * 1e6),
+            'filtered': (time_diff2, filteredPressure[2:] / 20),
+        }
+        pyramids = {}
+        for key, (_, y) in traces.items():
+            pyramids[key] = MinMaxPyramid(y)
+            check_cancelled(cancel_event)
+
+        session = pc_core.load_session(pressure_file, fluorescence_file)
+        return {
+            'pressure_freq': pressure_freq,
+            'fluo_freq': fluo_freq,
+            'baseline_window': baseline_window,
+            'approx_baseline': bool(baseline_window) and approx_baseline,
+            't_pressure': t_pressure,
+            'fluorescence_data': fluorescence_data,
+            'raw_fluorescence': raw_fluorescence,
+            't_fluo': t_fluo,
+            'time_peaks': time_peaks,
+            'traces': traces,
+            'pyramids': pyramids,
+            'session': session,
+        }
+
+    def on_task_error(self, error):
+        self.status_var.set("处理失败")
+        messagebox.showerror("处理错误", str(error))
+
+    def cancel_task(self):
+        if self.runner.cancel():
+            self.status_var.set("已取消")
+
+    def render_plot_data(self, result):
+        """界面线程中根据后台计算结果重建图形。"""
+        self.time_windows = []  # 重置已记录的时间窗数据
+        self.time_window_patches = []  # 清空之前保存的patch对象
+        self.pressure_freq, self.fluo_freq = result['pressure_freq'], result['fluo_freq']
+        self.baseline_window = result['baseline_window']
+        self.baseline_approx = result['approx_baseline']
+        self.t_pressure = result['t_pressure']
+        self.fluorescence_data, self.t_fluo = result['fluorescence_data'], result['t_fluo']
+        self.raw_fluorescence = result['raw_fluorescence']
+        self.time_peaks = time_peaks = result['time_peaks']
+        traces, pyramids = result['traces'], result['pyramids']
 
         # ----------------------------
         # 更新图形显示区域
         # ----------------------------
+        if self.canvas is not None:
+            plt.close(self.canvas.figure)
         self.plot_frame.destroy()
         self.plot_frame = tk.Frame(self.plot_canvas)
         self.plot_canvas.create_window((0, 0), window=self.plot_frame, anchor="nw")
         self.plot_frame.bind("<Configure>",
                              lambda event: self.plot_canvas.configure(scrollregion=self.plot_canvas.bbox("all")))
 
-        # 子图数量：电刺激、原始压力、二阶差分 及各神经元荧光
-        num_subplots = 3 + len(self.fluorescence_data)
+        # 子图数量：电刺激、原始压力、二阶差分 及神经元子图池
+        # 神经元子图数量固定，与神经元总数无关，滚动时只替换曲线数据
+        n_pool = min(len(self.fluorescence_data), NEURON_POOL_SIZE)
+        num_subplots = 3 + n_pool
         fig, axes = plt.subplots(num_subplots, 1, figsize=(80, num_subplots * 2), sharex=True)
         if num_subplots == 1:
             axes = [axes]
         self.axes = axes
 
+        # 800Hz 的电刺激与压力曲线按显示范围降采样绘制，缩放时自动补充细节
+        self.lod_lines = []
+
         # 子图1：电刺激信号图
-        axes[0].plot(self.t_pressure, electrical_stim, 'b', linewidth=1.5)
+        self.lod_lines.append(DecimatedLine(axes[0], *traces['stim'], 'b', linewidth=1.5,
+                                            pyramid=pyramids['stim']))
         axes[0].set_title("电刺激")
         axes[0].set_ylabel("幅值")
         axes[0].set_xlabel("时间 (s)")
 
         # 子图2：原始压力数据图
-        axes[1].plot(self.t_pressure, pressure_coef, 'r', linewidth=1.5, label='原始压力数据')
+        self.lod_lines.append(DecimatedLine(axes[1], *traces['pressure'], 'r', linewidth=1.5,
+                                            label='原始压力数据', pyramid=pyramids['pressure']))
         axes[1].set_title("原始压力数据")
         axes[1].set_ylabel("压力")
         axes[1].set_xlabel("时间 (s)")
         axes[1].legend(loc="upper right")
 
         # 子图3：二阶差分压力数据图（滤波压力截取前两项对齐）
-        axes[2].plot(time_diff2, pressureDiff2 * 1e6, 'g', linewidth=1.5, label='二阶差分')
-        axes[2].plot(time_diff2, filteredPressure[2:] / 20, 'k', linewidth=1.5, label='滤波压力/20')
-        # 在此图中检测峰值，并以虚线标注（此处不影响时间窗标记）
-        peaks, properties = find_peaks(pressureDiff2 * 1e6, height=2)
-        time_peaks = time_diff2[peaks]
+        self.lod_lines.append(DecimatedLine(axes[2], *traces['diff2'], 'g', linewidth=1.5,
+                                            label='二阶差分', pyramid=pyramids['diff2']))
+        self.lod_lines.append(DecimatedLine(axes[2], *traces['filtered'], 'k', linewidth=1.5,
+                                            label='滤波压力/20', pyramid=pyramids['filtered']))
+        # 在此图中以虚线标注检测峰值（此处不影响时间窗标记）
         if len(time_peaks) > 0:
             axes[2].axvline(x=time_peaks[0], color='orange', linestyle='--', linewidth=1, label='检测峰值')
             for t in time_peaks[1:]:
@@ -235,49 +408,168 @@ class DataVisualizer(tk.Tk):
         # 将二阶差分图设为响应点击标记时间窗的区域
         self.diff2_ax = axes[2]
 
-        # 子图4及以后：各神经元荧光信号图
-        for idx, curve in enumerate(self.fluorescence_data):
-            ax = axes[3 + idx]
-            ax.plot(self.t_fluo, curve, linewidth=0.8)
-            ax.set_title(f"神经元 {idx + 1}")
+        # 子图4及以后：神经元子图池
+        self.neuron_offset = 0
+        self.neuron_axes = list(axes[3:])
+        self.neuron_lines = []
+        for slot, ax in enumerate(self.neuron_axes):
+            line, = ax.plot(self.t_fluo, self.fluorescence_data[slot], linewidth=0.8)
             ax.set_ylabel("荧光强度")
             ax.set_xlabel("时间 (s)")
+            self.neuron_lines.append(line)
+        self.update_neuron_axes()
 
         for ax in axes:
             ax.xaxis.set_major_locator(ticker.MultipleLocator(50))
         fig.tight_layout()
 
+        self.background = None
         self.canvas = FigureCanvasTkAgg(fig, master=self.plot_frame)
+        self.canvas.mpl_connect("draw_event", self.on_draw)
         self.canvas.draw()
+        # 工具栏用于缩放/平移，降采样曲线随显示范围更新
+        self.toolbar = NavigationToolbar2Tk(self.canvas, self.plot_frame, pack_toolbar=False)
+        self.toolbar.update()
+        self.toolbar.pack(side=tk.TOP, fill=tk.X)
         self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
         self.canvas.mpl_connect("button_press_event", self.on_click)
+        self.canvas.mpl_connect("scroll_event", self.on_scroll)
+        self.status_var.set(f"已绘制 {len(self.fluorescence_data)} 个神经元，检测到 {len(time_peaks)} 个峰")
+
+        # 同一对文件（内容未改变）之前标注过时间窗时自动恢复
+        session = result['session']
+        if session is not None and session['time_windows']:
+            for window in session['time_windows']:
+                self.add_time_window(window)
+            self.draw_time_windows()
+            self.status_var.set(f"已绘制 {len(self.fluorescence_data)} 个神经元，"
+                                f"从会话文件恢复 {len(self.time_windows)} 个时间窗")
+
+    def on_draw(self, event):
+        # 完整重绘后缓存静态背景（时间窗 patch 为 animated，不在其中），再叠加时间窗
+        self.background = self.canvas.copy_from_bbox(self.canvas.figure.bbox)
+        self.draw_time_windows(blit=False)
+
+    def draw_time_windows(self, blit=True):
+        """在缓存的背景上只重绘时间窗 patch，避免重新渲染所有曲线。"""
+        if self.canvas is None or self.background is None:
+            return
+        if blit:
+            self.canvas.restore_region(self.background)
+        fig = self.canvas.figure
+        for patches in self.time_window_patches:
+            for patch in patches:
+                fig.draw_artist(patch)
+        self.canvas.blit(fig.bbox)
+
+    def update_neuron_axes(self):
+        """将子图池切换为从 neuron_offset 开始的神经元，并更新滚动条与标签。"""
+        n_neurons = len(self.fluorescence_data)
+        n_pool = len(self.neuron_axes)
+        for slot, (ax, line) in enumerate(zip(self.neuron_axes, self.neuron_lines)):
+            idx = self.neuron_offset + slot
+            line.set_ydata(self.fluorescence_data[idx])
+            ax.set_title(f"神经元 {idx + 1}")
+            ax.relim()
+            ax.autoscale_view(scalex=False)
+        if n_neurons > 0:
+            self.neuron_scrollbar.set(self.neuron_offset / n_neurons, (self.neuron_offset + n_pool) / n_neurons)
+            self.lbl_neuron_range.config(
+                text=f"神经元 {self.neuron_offset + 1}-{self.neuron_offset + n_pool}/{n_neurons}")
+
+    def set_neuron_offset(self, offset):
+        if self.fluorescence_data is None or not self.neuron_axes:
+            return
+        max_offset = len(self.fluorescence_data) - len(self.neuron_axes)
+        offset = int(min(max(offset, 0), max_offset))
+        if offset == self.neuron_offset:
+            return
+        self.neuron_offset = offset
+        self.update_neuron_axes()
+        self.canvas.draw_idle()
+
+    def scroll_neurons(self, *args):
+        # Tk 滚动条回调：('moveto', 比例) 或 ('scroll', 数量, 'units'/'pages')
+        if self.fluorescence_data is None:
+            return
+        if args[0] == 'moveto':
+            self.set_neuron_offset(round(float(args[1]) * len(self.fluorescence_data)))
+        elif args[0] == 'scroll':
+            step = int(args[1]) * (len(self.neuron_axes) if args[2] == 'pages' else 1)
+            self.set_neuron_offset(self.neuron_offset + step)
+
+    def on_scroll(self, event):
+        # 在神经元子图上滚动鼠标滚轮时切换显示的神经元
+        if event.inaxes in self.neuron_axes:
+            self.set_neuron_offset(self.neuron_offset - int(event.step))
 
     def on_click(self, event):
+        # 工具栏处于缩放/平移模式时不记录时间窗
+        if self.toolbar is not None and self.toolbar.mode:
+            return
         # 仅在二阶差分图中响应点击
         if event.inaxes == self.diff2_ax and event.xdata is not None:
             clicked_time = event.xdata
             try:
                 window_len = float(self.entry_time_window.get())
+                note = ""
             except ValueError:
                 window_len = 5.0
-                messagebox.showwarning("参数错误", "时间窗口输入无效，使用默认5秒")
+                note = "（时间窗口输入无效，使用默认5秒）"
             window = (clicked_time, clicked_time + window_len)
-            self.time_windows.append(window)
-            # 在所有子图中添加标记 patch，并保存这些patch对象以便后续撤销
-            patches = []
-            for ax in self.axes:
-                patch = ax.axvspan(window[0], window[1], facecolor='gray', alpha=0.3)
-                patches.append(patch)
-            self.time_window_patches.append(patches)
-            self.canvas.draw()
-            messagebox.showinfo("时间窗记录", f"记录时间窗: {window[0]:.2f} 到 {window[1]:.2f}秒")
+            self.add_time_window(window)
+            self.draw_time_windows()
+            self.status_var.set(f"记录时间窗 {len(self.time_windows)}: {window[0]:.2f} 到 {window[1]:.2f}秒{note}")
+            self.save_session()
+
+    def add_time_window(self, window):
+        self.time_windows.append(window)
+        # 在所有子图中添加标记 patch，并保存这些patch对象以便后续撤销
+        patches = []
+        for ax in self.axes:
+            patch = ax.axvspan(window[0], window[1], facecolor='gray', alpha=0.3, animated=True)
+            patches.append(patch)
+        self.time_window_patches.append(patches)
+
+    def auto_time_windows(self):
+        if self.time_peaks is None:
+            messagebox.showwarning("数据不足", "请先绘制图形")
+            return
+        try:
+            window_len = float(self.entry_time_window.get())
+        except ValueError:
+            window_len = 5.0
+            messagebox.showwarning("参数错误", "时间窗口输入无效，使用默认5秒")
+        try:
+            refractory_text = self.entry_refractory.get().strip()
+            refractory = float(refractory_text) if refractory_text else None
+            merge_gap = float(self.entry_merge_gap.get() or 0)
+        except ValueError:
+            messagebox.showwarning("参数错误", "不应期或峰合并间隔输入无效")
+            return
+
+        # 清除已有时间窗后，按检测峰重新生成
+        while self.time_windows:
+            self.time_windows.pop()
+            for patch in self.time_window_patches.pop():
+                try:
+                    patch.remove()
+                except Exception:
+                    pass
+        windows = pc_core.peaks_to_windows(self.time_peaks, window_len, refractory=refractory,
+                                           merge_gap=merge_gap, t_max=self.t_fluo[-1])
+        for window in windows:
+            self.add_time_window(window)
+        self.draw_time_windows()
+        self.status_var.set(f"由检测峰生成 {len(windows)} 个时间窗")
+        self.save_session()
 
     def undo_time_window(self):
         if not self.time_windows:
-            messagebox.showinfo("提示", "没有时间窗记录可撤销")
+            self.status_var.set("没有时间窗记录可撤销")
             return
         # 撤销最后一次记录的时间窗
-        self.time_windows.pop()
+        window = self.time_windows.pop()
         if self.time_window_patches:
             last_patches = self.time_window_patches.pop()
             for patch in last_patches:
@@ -285,51 +577,48 @@ class DataVisualizer(tk.Tk):
                     patch.remove()
                 except Exception:
                     pass
-        self.canvas.draw()
+        self.draw_time_windows()
+        self.status_var.set(f"已撤销时间窗: {window[0]:.2f} 到 {window[1]:.2f}秒，剩余 {len(self.time_windows)} 个")
+        self.save_session()
 
     def save_data(self):
         if self.fluorescence_data is None or len(self.time_windows) == 0:
             messagebox.showwarning("数据不足", "请先生成时间窗后再保存数据")
             return
-        segments = {}
-        for i, signal in enumerate(self.fluorescence_data):
-            segments[i] = []
-            for window in self.time_windows:
-                start, end = window
-                indices = np.where((self.t_fluo >= start) & (self.t_fluo < end))[0]
-                if len(indices) > 0:
-                    seg = signal[indices]
-                    segments[i].append(seg)
+        # 时间窗边界一次求出，所有片段截取到 (神经元, 时间窗, 采样点) 数组
+        segments, kept = pc_core.extract_windows(self.fluorescence_data, self.t_fluo, self.time_windows)
+        if len(kept) == 0:
+            messagebox.showwarning("数据不足", "时间窗内没有荧光数据")
+            return
         file_path = filedialog.asksaveasfilename(defaultextension=".xlsx",
-                                                 filetypes=[("Excel files", "*.xlsx"), ("Text files", "*.txt")])
+                                                 filetypes=[("Excel files", "*.xlsx"), ("Text files", "*.txt"),
+                                                            ("NumPy files", "*.npz"), ("Parquet files", "*.parquet"),
+                                                            ("HDF5 files", "*.h5")])
         if not file_path:
             return
-        if file_path.endswith('.xlsx'):
-            with pd.ExcelWriter(file_path) as writer:
-                for i, seg_list in segments.items():
-                    if len(seg_list) == 0:
-                        continue
-                    min_len = min(len(seg) for seg in seg_list)
-                    data = {}
-                    for j, seg in enumerate(seg_list):
-                        data[f'window_{j + 1}'] = seg[:min_len]
-                    df = pd.DataFrame(data)
-                    df.to_excel(writer, sheet_name=f'Neuron_{i + 1}', index=False)
-            messagebox.showinfo("保存成功", f"数据已保存到 {file_path}")
-        else:
-            with open(file_path, 'w') as f:
-                for i, seg_list in segments.items():
-                    if len(seg_list) == 0:
-                        continue
-                    min_len = min(len(seg) for seg in seg_list)
-                    f.write(f'Neuron {i + 1}\n')
-                    for j, seg in enumerate(seg_list):
-                        f.write(f'Window {j + 1}:\n')
-                        np.savetxt(f, seg[:min_len], fmt='%f')
-                    f.write('\n')
-            messagebox.showinfo("保存成功", f"数据已保存到 {file_path}")
+        summary = None
+        pre_text = self.entry_pre.get().strip()
+        if pre_text:
+            try:
+                # ΔF/F 以原始荧光为分母，不使用扣除基线后的数据
+                summary = event_average.event_triggered_average(self.raw_fluorescence, self.t_fluo,
+                                                                self.time_windows, self.fluo_freq,
+                                                                pre=float(pre_text))
+            except ValueError as e:
+                messagebox.showwarning("触发平均", f"未生成汇总表:\n{e}")
+        metadata = pc_core.session_metadata(self.pressure_file, self.fluorescence_file, self.pressure_freq,
+                                            self.fluo_freq, [self.time_windows[k] for k in kept],
+                                            baseline_window=self.baseline_window,
+                                            approx_baseline=self.baseline_approx)
+        try:
+            pc_core.write_segments(file_path, segments, summary=summary, metadata=metadata)
+        except ImportError as e:
+            messagebox.showerror("保存失败", str(e))
+            return
+        messagebox.showinfo("保存成功", f"数据已保存到 {file_path}")
 
     def on_closing(self):
+        self.runner.shutdown()
         plt.close('all')
         self.destroy()
 
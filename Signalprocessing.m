@@ -33,6 +33,15 @@ CalciumData_corrected = CalciumData(cellIndex, :) - baseline_estimate;
 % 这里我们将校正后的信号作为输入进行事件检测，得到的检测索引即对应校正后信号
 DetectedEvents_corrected = TransientDetection(CalciumData_corrected, Parameters);
 
+% --- 导出校验数据（可选）---
+% exportFolder 非空时，对全部神经元的原始信号（不做基线校正）检测并导出 onset/peak/end.txt，
+% 供 transient_detection.py --compare 校验 Python 实现。更新仓库中的校验数据：
+%   dataPath = 'fixtures/transient/calcium.txt';  exportFolder = 'fixtures/transient';
+exportFolder = '';
+if ~isempty(exportFolder)
+    ExportDetectedEvents(TransientDetection(CalciumData, Parameters), exportFolder);
+end
+
 % --- 绘图显示 ---
 figure;
 
@@ -274,3 +283,24 @@ function DetectedEvents = TransientDetection(CalciumData, Parameters)
     end
     DetectedEvents.DetectionNeeded = DetectionNeeded;
 end
+
+%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+%% ExportDetectedEvents 函数定义
+function ExportDetectedEvents(DetectedEvents, folder)
+% ExportDetectedEvents - 将检测结果写入 onset.txt / peak.txt / end.txt
+% 每行对应一个神经元，为以空格分隔的 1 起始索引
+    if ~exist(folder, 'dir')
+        mkdir(folder);
+    end
+    fields = {'OnsetDetectionResult', 'PeakDetectionResult', 'EndDetectionResult'};
+    names = {'onset.txt', 'peak.txt', 'end.txt'};
+    for f = 1:numel(fields)
+        results = DetectedEvents.(fields{f});
+        fid = fopen(fullfile(folder, names{f}), 'w');
+        for cell_index = 1:numel(results)
+            fprintf(fid, '%d ', results{cell_index});
+            fprintf(fid, '\n');
+        end
+        fclose(fid);
+    end
+end
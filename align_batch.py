@@ -0,0 +1,167 @@
+"""
+刺激/荧光信号批量对齐命令行。
+
+清单文件为 CSV，每行一对记录，列为 stim、fluo、duration_ms，可选列 offset_ms
+（刺激到荧光响应的延迟，默认 150 ms）与 output（平移后刺激信号的输出文件名）；
+相对路径以清单文件所在目录为准。未给出 output 时由 stim 的相对路径生成（子目录
+以 _ 连接），输出文件名重复的清单会被拒绝。各对记录在进程池中并行对齐，平移后的刺激信号
+写入输出目录，并生成记录所有平移量的汇总 CSV。
+
+示例:
+    python align_batch.py manifest.csv -o aligned/ --method xcorr --workers 8
+"""
+import argparse
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+import align_core
+
+SUMMARY_FIELDS = ['name', 'stim', 'fluo', 'duration_ms', 'method', 'lag_ms', 'shift_ms', 'shift_samples',
+                  'score', 'output', 'error']
+
+
+def job_name(stim, base_dir):
+    """由 stim 相对清单目录的路径生成记录名，如 a/b/stim0.txt -> a_b_stim0。"""
+    try:
+        rel = os.path.relpath(stim, base_dir)
+    except ValueError:  # Windows 下不在同一驱动器
+        rel = os.path.basename(stim)
+    parts = [part for part in rel.replace('\\', '/').split('/') if part not in ('', '.', '..')]
+    return os.path.splitext('_'.join(parts))[0]
+
+
+def read_manifest(manifest_path, default_duration_ms=None, default_offset_ms=align_core.DEFAULT_OFFSET_MS):
+    """
+    读取清单文件，返回任务字典列表（stim、fluo、duration_ms、offset_ms、output、name）。
+
+    不同记录的输出文件名相同时抛出 ValueError，避免互相覆盖。
+    """
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    jobs = []
+    with open(manifest_path, 'r', encoding='utf-8-sig', newline='') as f:
+        for line_no, row in enumerate(csv.DictReader(f), start=2):
+            row = {key.strip(): (value or '').strip() for key, value in row.items() if key}
+            if not row.get('stim') or not row.get('fluo'):
+                print(f'清单第 {line_no} 行缺少 stim 或 fluo，已跳过')
+                continue
+            duration = row.get('duration_ms') or default_duration_ms
+            if duration is None:
+                print(f'清单第 {line_no} 行缺少 duration_ms，已跳过')
+                continue
+            stim = os.path.join(base_dir, row['stim'])
+            name = job_name(stim, base_dir)
+            jobs.append({
+                'name': name,
+                'stim': stim,
+                'fluo': os.path.join(base_dir, row['fluo']),
+                'duration_ms': float(duration),
+                'offset_ms': float(row.get('offset_ms') or default_offset_ms),
+                'output': row.get('output') or f'{name}_aligned.txt',
+                'line_no': line_no,
+            })
+
+    seen = {}
+    duplicates = []
+    for job in jobs:
+        key = os.path.normcase(os.path.normpath(job['output']))
+        if key in seen:
+            duplicates.append(f"第 {seen[key]} 行与第 {job['line_no']} 行: {job['output']}")
+        else:
+            seen[key] = job['line_no']
+    if duplicates:
+        raise ValueError('清单中的输出文件名重复:\n' + '\n'.join(duplicates))
+    return jobs
+
+
+def align_job(job, output_dir, method='xcorr', max_lag_ms=None):
+    """
+    对齐一对记录并写出平移后的刺激信号，返回汇总表中的一行。
+    """
+    stim = align_core.load_first_column(job['stim'])
+    fluo = align_core.load_first_column(job['fluo'])
+    if stim.size == 0 or fluo.size == 0:
+        raise ValueError("至少有一个文件未读到有效数值")
+    if method == 'peaks':
+        result = align_core.align_stim_by_peaks(stim, fluo, job['duration_ms'], offset_ms=job['offset_ms'])
+    else:
+        result = align_core.align_stim(stim, fluo, job['duration_ms'], offset_ms=job['offset_ms'],
+                                       max_lag_ms=max_lag_ms)
+    output_file = os.path.join(output_dir, job['output'])
+    os.makedirs(os.path.dirname(os.path.abspath(output_file)), exist_ok=True)  # output 可以带子目录
+    np.savetxt(output_file, result['translated_stim'], fmt='%.6f')
+    return {
+        'name': job['name'],
+        'stim': job['stim'],
+        'fluo': job['fluo'],
+        'duration_ms': job['duration_ms'],
+        'method': method,
+        'lag_ms': round(result['lag_ms'], 4),
+        'shift_ms': round(result['shift_ms'], 4),
+        'shift_samples': round(float(result['shift_samples']), 4),
+        'score': round(result['score'], 4),
+        'output': output_file,
+        'error': '',
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='批量对齐刺激信号与荧光信号')
+    parser.add_argument('manifest', type=str, help='清单 CSV（列: stim, fluo, duration_ms[, offset_ms, output]）')
+    parser.add_argument('-o', '--output_dir', default='aligned', type=str, help='平移后刺激信号的输出目录')
+    parser.add_argument('--method', default='xcorr', choices=['xcorr', 'peaks'],
+                        help='xcorr: 互相关自动对齐；peaks: 第一个刺激峰对齐第一个荧光峰')
+    parser.add_argument('--duration_ms', default=None, type=float, help='清单中未给出时使用的时间轴长度(ms)')
+    parser.add_argument('--offset_ms', default=align_core.DEFAULT_OFFSET_MS, type=float,
+                        help='清单中未给出时使用的刺激到响应延迟(ms)')
+    parser.add_argument('--max_lag_ms', default=None, type=float, help='互相关搜索的最大延迟(ms)')
+    parser.add_argument('--summary', default='alignment_summary.csv', type=str, help='汇总 CSV 文件名（位于输出目录）')
+    parser.add_argument('--workers', default=None, type=int, help='进程数，默认为 CPU 核数')
+    arg = parser.parse_args()
+
+    try:
+        jobs = read_manifest(arg.manifest, arg.duration_ms, arg.offset_ms)
+    except ValueError as e:
+        print(e)
+        return
+    if not jobs:
+        print(f'{arg.manifest} 中没有有效的记录')
+        return
+    os.makedirs(arg.output_dir, exist_ok=True)
+
+    start_time = time.time()
+    rows = []
+    error_file_list = []
+    with ProcessPoolExecutor(max_workers=arg.workers) as executor:
+        futures = {executor.submit(align_job, job, arg.output_dir, arg.method, arg.max_lag_ms): i
+                   for i, job in enumerate(jobs)}
+        for future in as_completed(futures):
+            i = futures[future]
+            job = jobs[i]
+            try:
+                row = future.result()
+                print(f"{job['name']}: 平移 {row['shift_ms']:.2f} ms -> {row['output']}")
+            except Exception as e:
+                print(f"{job['name']} 处理失败.\nerror message:\n{e}")
+                error_file_list.append(job['name'])
+                row = {key: job.get(key, '') for key in ('name', 'stim', 'fluo', 'duration_ms')}
+                row.update(method=arg.method, error=str(e))
+            rows.append((i, row))
+
+    # 汇总表按清单顺序排列
+    rows = [row for _, row in sorted(rows, key=lambda item: item[0])]
+    summary_path = os.path.join(arg.output_dir, arg.summary)
+    with open(summary_path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f'共处理 {len(jobs)} 对记录，用时 {time.time() - start_time:.1f} 秒，汇总表: {summary_path}')
+    if error_file_list:
+        print(f'处理失败的记录:\n{error_file_list}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+"""
+刺激信号与钙荧光信号的对齐（不依赖 Tk）。
+
+align_signals.py 的图形界面与批处理共用这里的读取与对齐逻辑。两个信号都假定
+均匀覆盖 [0, duration_ms]。自动对齐时先把两者线性插值到同一时间网格，用基于
+FFT 的互相关求延迟（O(N log N)），再对互相关峰做抛物线插值得到亚采样精度。
+"""
+import csv
+import warnings
+
+import numpy as np
+import pandas as pd
+from scipy.fft import irfft, next_fast_len, rfft
+from scipy.signal import find_peaks
+
+import data_cache
+
+DEFAULT_OFFSET_MS = 150.0  # 刺激到荧光响应的固定延迟，与手动校准中的 150 ms 相同
+STIM_PEAK_HEIGHT = 1  # 刺激信号峰值阈值
+HEADER_PROBE_LINES = 100  # 读取第一列时检查表头的最大行数
+
+
+def load_first_column(path):
+    """
+    读取文件第一列为一维数组，解析结果会缓存到磁盘，见 data_cache。
+    """
+    # 缓存标签随解析规则变化：v2 起 nan 等缺失值也被跳过
+    return data_cache.cached_load(path, lambda: _read_first_column(path), tag='first-column-v2')
+
+
+def _read_first_column(path):
+    """
+    读取以空白分隔的第一列，跳过开头的表头行、空行、无法转换为数值的行与缺失值（如 nan）。
+
+    常见的纯数值文件由 np.loadtxt 的 C 解析器直接读取；遇到中间夹有文字等无法转换的
+    行时改用 pandas 逐值转换，只有 pandas 解析失败时才退回逐行读取。
+    """
+    skiprows = _count_header_lines(path)
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', UserWarning)  # 空文件
+            values = np.loadtxt(path, dtype=np.float64, usecols=0, skiprows=skiprows, comments=None,
+                                ndmin=1, encoding='utf-8')
+    except ValueError:
+        values = _read_first_column_tolerant(path, skiprows)
+    return values[~np.isnan(values)]
+
+
+def _read_first_column_tolerant(path, skiprows):
+    """pandas C 解析器读取第一列，无法转换为数值的值记为 NaN。"""
+    try:
+        column = pd.read_csv(path, sep=r'\s+', header=None, usecols=[0], engine='c',
+                             skiprows=skiprows, quoting=csv.QUOTE_NONE,
+                             skip_blank_lines=True, low_memory=False, encoding='utf-8',
+                             encoding_errors='replace').iloc[:, 0]
+    except pd.errors.EmptyDataError:
+        return np.array([])
+    except (ValueError, pd.errors.ParserError):
+        return _parse_first_column(path)
+    return pd.to_numeric(column, errors='coerce').to_numpy(dtype=np.float64)
+
+
+def _count_header_lines(path, max_lines=HEADER_PROBE_LINES):
+    """统计文件开头第一列不是数值的行数（空行计入），最多检查 max_lines 行。"""
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        for i, line in enumerate(f):
+            if i >= max_lines:
+                return i
+            parts = line.split()
+            if not parts:
+                continue
+            try:
+                float(parts[0])
+                return i
+            except ValueError:
+                continue
+    return 0
+
+
+def _parse_first_column(path):
+    """
+    逐行读取文件，尝试将每行第一列转换为 float，跳过无法转换的行。
+    """
+    vals = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            parts = line.strip().split()
+            if not parts:
+                continue
+            try:
+                vals.append(float(parts[0]))
+            except ValueError:
+                continue
+    return np.array(vals)
+
+
+def resample(y, duration_ms, dt_ms):
+    """把均匀覆盖 [0, duration_ms] 的信号线性插值到步长为 dt_ms 的网格。"""
+    t_src = np.linspace(0, duration_ms, len(y))
+    t_dst = np.arange(0, duration_ms + dt_ms / 2, dt_ms)
+    return np.interp(t_dst, t_src, y)
+
+
+def parabolic_peak(values, k):
+    """对 values[k-1:k+2] 做抛物线拟合，返回极值位置相对 k 的偏移（-0.5 到 0.5）。"""
+    if k <= 0 or k >= len(values) - 1:
+        return 0.0
+    y0, y1, y2 = values[k - 1], values[k], values[k + 1]
+    denom = y0 - 2 * y1 + y2
+    if denom == 0:
+        return 0.0
+    return float(np.clip(0.5 * (y0 - y2) / denom, -0.5, 0.5))
+
+
+def xcorr_lag(reference, signal, max_lag=None):
+    """
+    求 signal 相对 reference 的延迟（采样点，可为小数）：signal(t) ≈ reference(t - lag)。
+
+    两者先去均值，用 rfft 计算全部延迟的互相关；max_lag 限制搜索范围。
+    返回 (lag, 归一化互相关峰值)。
+    """
+    a = np.asarray(reference, dtype=np.float64)
+    b = np.asarray(signal, dtype=np.float64)
+    a = a - a.mean()
+    b = b - b.mean()
+    n = next_fast_len(len(a) + len(b) - 1, real=True)
+    corr = irfft(np.conj(rfft(a, n)) * rfft(b, n), n)
+    # corr[k] 对应延迟 k（k >= 0）或 k - n（负延迟），重排为 -(len(a)-1) .. len(b)-1
+    corr = np.concatenate([corr[n - len(a) + 1:], corr[:len(b)]])
+    lags = np.arange(-(len(a) - 1), len(b))
+    if max_lag is not None:
+        keep = np.abs(lags) <= max_lag
+        corr, lags = corr[keep], lags[keep]
+    k = int(np.argmax(corr))
+    norm = np.sqrt(np.dot(a, a) * np.dot(b, b))
+    score = float(corr[k] / norm) if norm > 0 else 0.0
+    return lags[k] + parabolic_peak(corr, k), score
+
+
+def shift_signal(y, shift_samples):
+    """把信号向后平移 shift_samples 个采样点（可为小数，线性插值），移出部分补 0。"""
+    y = np.asarray(y, dtype=np.float64)
+    idx = np.arange(len(y))
+    return np.interp(idx - shift_samples, idx, y, left=0.0, right=0.0)
+
+
+def align_stim(stim, fluo, duration_ms, offset_ms=DEFAULT_OFFSET_MS, max_lag_ms=None, dt_ms=None,
+               rising_edge=True):
+    """
+    用互相关自动对齐刺激信号与荧光信号。
+
+    两个信号插值到同一网格（默认取两者中较小的采样间隔）后求荧光相对刺激的延迟，
+    扣除固定的响应延迟 offset_ms 即为刺激信号需要平移的时间。rising_edge 为真时
+    与荧光的上升沿（正的一阶差分）做互相关，延迟对应响应起点，不受钙信号衰减
+    时长的影响；为假时直接与荧光信号做互相关。返回字典：
+    'lag_ms'（互相关延迟）、'shift_ms'、'shift_samples'（刺激信号采样点，可为小数）、
+    'score'（归一化互相关峰值）与 'translated_stim'（平移后的刺激信号，长度不变）。
+    """
+    stim = np.asarray(stim, dtype=np.float64)
+    fluo = np.asarray(fluo, dtype=np.float64)
+    dt_stim = duration_ms / max(len(stim) - 1, 1)
+    dt_fluo = duration_ms / max(len(fluo) - 1, 1)
+    if dt_ms is None:
+        dt_ms = min(dt_stim, dt_fluo)
+    max_lag = None if max_lag_ms is None else int(np.ceil(max_lag_ms / dt_ms))
+    fluo_grid = resample(fluo, duration_ms, dt_ms)
+    if rising_edge:
+        fluo_grid = np.maximum(np.gradient(fluo_grid), 0)
+    lag, score = xcorr_lag(resample(stim, duration_ms, dt_ms), fluo_grid, max_lag)
+    lag_ms = lag * dt_ms
+    shift_ms = lag_ms - offset_ms
+    shift_samples = shift_ms / dt_stim
+    return {
+        'lag_ms': lag_ms,
+        'shift_ms': shift_ms,
+        'shift_samples': shift_samples,
+        'score': score,
+        'translated_stim': shift_signal(stim, shift_samples),
+    }
+
+
+def align_stim_by_peaks(stim, fluo, duration_ms, offset_ms=DEFAULT_OFFSET_MS):
+    """
+    按峰值对齐：与手动校准相同，把刺激信号第一个峰（阈值 STIM_PEAK_HEIGHT）平移到
+    荧光信号第一个峰（阈值为均值 + 2 倍标准差）之前 offset_ms 处，按整数采样点平移。
+
+    返回与 align_stim 相同结构的字典（'lag_ms' 为两个峰的时间差，'score' 为 NaN）；
+    任一信号没有峰时抛出 ValueError。
+    """
+    stim = np.asarray(stim, dtype=np.float64)
+    fluo = np.asarray(fluo, dtype=np.float64)
+    stim_peaks, _ = find_peaks(stim, height=STIM_PEAK_HEIGHT)
+    fluo_peaks, _ = find_peaks(fluo, height=fluo.mean() + 2 * fluo.std())
+    if len(stim_peaks) == 0 or len(fluo_peaks) == 0:
+        raise ValueError("刺激信号或荧光信号中未找到有效峰值")
+    dt_stim = duration_ms / max(len(stim) - 1, 1)
+    dt_fluo = duration_ms / max(len(fluo) - 1, 1)
+    lag_ms = fluo_peaks[0] * dt_fluo - stim_peaks[0] * dt_stim
+    shift_samples = int((lag_ms - offset_ms) / dt_stim)
+    return {
+        'lag_ms': lag_ms,
+        'shift_ms': shift_samples * dt_stim,
+        'shift_samples': shift_samples,
+        'score': float('nan'),
+        'translated_stim': shift_signal(stim, shift_samples),
+    }
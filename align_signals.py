@@ -4,28 +4,17 @@ import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
 import sys
+import functools
 from scipy.signal import find_peaks
 
+import align_core
+from align_core import load_first_column
+from tk_worker import BackgroundRunner, check_cancelled
+
 # 设置中文字体以避免警告
 plt.rcParams['font.sans-serif'] = ['SimHei']  # 指定中文字体
 plt.rcParams['axes.unicode_minus'] = False   # 正常显示负号
 
-def load_first_column(path):
-    """
-    逐行读取文件，尝试将每行第一列转换为 float，跳过无法转换的行。
-    """
-    vals = []
-    with open(path, 'r', encoding='utf-8') as f:
-        for line in f:
-            parts = line.strip().split()
-            if not parts:
-                continue
-            try:
-                vals.append(float(parts[0]))
-            except ValueError:
-                continue
-    return np.array(vals)
-
 class SignalComparer(tk.Tk):
     def __init__(self):
         super().__init__()
@@ -52,13 +41,18 @@ class SignalComparer(tk.Tk):
         self.time_entry.insert(0, "45000")  # 默认45000ms
         self.time_entry.pack(pady=5)
 
-        # 绘制按钮
+        # 绘制按钮；读取与峰值检测在后台执行，可取消
         tk.Button(self, text="绘制信号", command=self.plot).pack(pady=10)
+        tk.Button(self, text="取消", command=self.cancel_task).pack()
+        self.runner = BackgroundRunner(self)
 
         # 校准按钮
         self.calibrate_button = tk.Button(self, text="校准刺激信号", command=self.calibrate_stim, state=tk.DISABLED)
         self.calibrate_button.pack(pady=10)
 
+        # 自动校准：互相关求刺激与荧光的延迟，无需点击黄点
+        tk.Button(self, text="自动校准（互相关）", command=self.auto_calibrate_stim).pack(pady=5)
+
         # 保存按钮
         tk.Button(self, text="保存平移后的刺激信号", command=self.save_translated_stim).pack(pady=10)
 
@@ -80,6 +74,12 @@ class SignalComparer(tk.Tk):
         self.selected_fluo_peak = None
         self.translated_stim = None
         self.fluo = None  # 存储荧光信号
+        self.stim = None  # 存储刺激信号
+        self.stim_peaks = None  # 刺激信号峰值索引
+
+        # 状态栏：显示后台读取进度
+        self.status_var = tk.StringVar(value="就绪")
+        tk.Label(self, textvariable=self.status_var, anchor="w", relief="sunken").pack(side=tk.BOTTOM, fill=tk.X)
 
     def select_stim(self):
         p = filedialog.askopenfilename(
@@ -112,9 +112,49 @@ class SignalComparer(tk.Tk):
             messagebox.showwarning("输入错误", "时间轴长度必须是正数！")
             return
 
+        task = functools.partial(self.compute_signals, stim_file, fluo_file)
+        self.runner.submit(task, functools.partial(self.render_signals, duration_ms),
+                           on_error=self.on_task_error, on_progress=self.status_var.set)
+        self.status_var.set("正在读取信号...")
+
+    @staticmethod
+    def compute_signals(stim_file, fluo_file, progress, cancel_event):
+        """后台线程中读取两个信号并检测峰值，不访问 Tk 控件。"""
+        progress("正在读取刺激信号...")
         stim = load_first_column(stim_file)
-        self.fluo = load_first_column(fluo_file)
+        check_cancelled(cancel_event)
+        progress("正在读取荧光信号...")
+        fluo = load_first_column(fluo_file)
+        check_cancelled(cancel_event)
+        if stim.size == 0 or fluo.size == 0:
+            return {'stim': stim, 'fluo': fluo}
+
+        progress("正在检测峰值...")
+        # **荧光信号峰值检测**：使用动态阈值
+        mean_fluo = np.mean(fluo)
+        std_fluo = np.std(fluo)
+        dynamic_threshold_fluo = mean_fluo + 2 * std_fluo  # 动态阈值：均值 + 2 标准差
+        fluo_peaks, _ = find_peaks(fluo, height=dynamic_threshold_fluo)  # 查找峰值，使用动态阈值
+
+        # **刺激信号峰值检测**：设定阈值为1，检测刺激信号峰值
+        stim_peaks, _ = find_peaks(stim, height=1)  # 查找刺激信号峰值，阈值为 1
+        return {'stim': stim, 'fluo': fluo, 'fluo_peaks': fluo_peaks, 'stim_peaks': stim_peaks}
+
+    def on_task_error(self, error):
+        self.status_var.set("处理失败")
+        messagebox.showerror("读取失败", str(error))
+
+    def cancel_task(self):
+        if self.runner.cancel():
+            self.status_var.set("已取消")
+
+    def render_signals(self, duration_ms, result):
+        """界面线程中绘制后台读取的信号。"""
+        self.stim = stim = result['stim']
+        self.fluo = result['fluo']
+        self.stim_peaks = stim_peaks = result.get('stim_peaks')
         if stim.size == 0 or self.fluo.size == 0:
+            self.status_var.set("读取失败")
             messagebox.showerror("读取失败", "至少有一个文件未读到有效数值！")
             return
 
@@ -126,15 +166,6 @@ class SignalComparer(tk.Tk):
         self.ax1.clear()
         self.ax2.clear()
 
-        # **荧光信号峰值检测**：使用动态阈值
-        mean_fluo = np.mean(self.fluo)
-        std_fluo = np.std(self.fluo)
-        dynamic_threshold_fluo = mean_fluo + 2 * std_fluo  # 动态阈值：均值 + 2 标准差
-        fluo_peaks, _ = find_peaks(self.fluo, height=dynamic_threshold_fluo)  # 查找峰值，使用动态阈值
-
-        # **刺激信号峰值检测**：设定阈值为1，检测刺激信号峰值
-        stim_peaks, _ = find_peaks(stim, height=1)  # 查找刺激信号峰值，阈值为 1
-
         # **绘制原始刺激信号和荧光信号**
         self.ax1.plot(t_stim, stim, label='原始刺激信号', color='tab:blue')
         self.ax1.plot(t_fluo, self.fluo, label='荧光信号', color='tab:red', alpha=0.7)
@@ -148,11 +179,12 @@ class SignalComparer(tk.Tk):
         # 设置标题和标签
         self.ax1.set_xlabel('时间 (ms)')
         self.ax1.set_ylabel('信号值')
-        self.ax1.set_title(f"原始信号对比")
+        self.ax1.set_title("原始信号对比")
         self.ax1.legend()
 
         self.fig.tight_layout()
         self.canvas.draw()
+        self.status_var.set(f"刺激信号 {len(stim)} 点，荧光信号 {len(self.fluo)} 点")
 
     def on_click(self, event):
         if event.inaxes != self.ax1:
@@ -180,9 +212,11 @@ class SignalComparer(tk.Tk):
             messagebox.showwarning("没有选择黄点", "请点击荧光信号设置黄点！")
             return
 
-        stim_file = self.stim_path.get()
-        stim = load_first_column(stim_file)
-        stim_peaks, _ = find_peaks(stim, height=1)  # 查找刺激信号峰值，阈值为 1
+        # 直接使用绘图时已读取的刺激信号及其峰值，不再重新读取文件
+        stim, stim_peaks = self.stim, self.stim_peaks
+        if stim is None or stim_peaks is None:
+            messagebox.showwarning("没有数据", "请先绘制信号！")
+            return
         if len(stim_peaks) == 0:
             messagebox.showwarning("没有峰值", "刺激信号中未找到有效峰值！")
             return
@@ -209,7 +243,34 @@ class SignalComparer(tk.Tk):
             self.translated_stim[:shift_samples] = stim[-shift_samples:]
             self.translated_stim[shift_samples:] = 0
 
-        # 在第二个子图上绘制平移后的刺激信号，并标记灰色区域
+        self.show_translated_stim(stim)
+
+    def auto_calibrate_stim(self):
+        if self.stim is None or self.fluo is None:
+            messagebox.showwarning("没有信号", "请先绘制信号！")
+            return
+        try:
+            duration_ms = float(self.time_entry.get())
+        except ValueError:
+            messagebox.showwarning("输入错误", "时间轴长度必须是正数！")
+            return
+        stim, fluo = self.stim, self.fluo
+
+        def task(progress, cancel_event):
+            return align_core.align_stim(stim, fluo, duration_ms)
+
+        self.runner.submit(task, self.on_auto_calibrated, on_error=self.on_task_error)
+        self.status_var.set("正在计算互相关...")
+
+    def on_auto_calibrated(self, result):
+        self.translated_stim = result['translated_stim']
+        self.show_translated_stim(self.stim)
+        self.status_var.set(f"互相关延迟 {result['lag_ms']:.2f} ms，刺激信号平移 {result['shift_ms']:.2f} ms"
+                            f"（相关系数 {result['score']:.3f}）")
+
+    def show_translated_stim(self, stim):
+        """在第二个子图上绘制平移后的刺激信号与荧光信号，并标记灰色区域。"""
+        self.ax2.clear()
         t_stim = np.linspace(0, float(self.time_entry.get()), len(self.translated_stim))
         self.ax2.plot(t_stim, self.translated_stim, label='平移后的刺激信号', color='tab:orange')
 
@@ -245,6 +306,7 @@ class SignalComparer(tk.Tk):
             messagebox.showinfo("保存成功", f"平移后的刺激信号已保存至 {save_path}")
 
     def on_closing(self):
+        self.runner.shutdown()
         self.destroy()
         sys.exit()
 
@@ -0,0 +1,86 @@
+"""
+荧光信号的局部基线校正。
+
+Signalprocessing.m 只对单个神经元用 medfilt1 估计基线；这里对 (神经元, 采样点)
+矩阵的每一行同时计算滑动中值基线并扣除，可放在事件检测或时间窗分段之前。
+
+精确模式与 MATLAB medfilt1(x, n) 一致（两端补零，偶数窗口取中间两个值的
+平均），每行调用 scipy.ndimage 的一维秩滤波，复杂度约为 O(T log w)。
+近似模式先按 step 个采样点分块取分位数，在缩短的序列上滤波后再插值，
+适合窗口很长、神经元很多的情况。
+"""
+import numpy as np
+from scipy import ndimage
+
+
+def running_median(data, window):
+    """
+    对每一行做滑动中值滤波，结果与 MATLAB medfilt1(x, window)（'zeropad'）相同。
+
+    偶数窗口覆盖 x[k - window/2 : k + window/2 - 1]，取中间两个值的平均。
+    """
+    data = np.atleast_2d(np.asarray(data, dtype=np.float64))
+    window = int(window)
+    if window <= 1:
+        return data.copy()
+    out = np.empty_like(data)
+    for row in range(data.shape[0]):
+        # 一维输入走 scipy 的快速秩滤波路径，二维 (1, w) 窗口要慢得多
+        x = data[row]
+        if window % 2:
+            out[row] = ndimage.median_filter(x, size=window, mode='constant', cval=0.0)
+        else:
+            lower = ndimage.rank_filter(x, window // 2 - 1, size=window, mode='constant', cval=0.0)
+            upper = ndimage.rank_filter(x, window // 2, size=window, mode='constant', cval=0.0)
+            out[row] = (lower + upper) / 2
+    return out
+
+
+def approx_percentile_baseline(data, window, percentile=50, step=None):
+    """
+    近似的滑动分位数基线。
+
+    先把每行按 step 个采样点分块取分位数（所有行一起计算），在缩短后的序列上做
+    长度约为 window / step 的滑动分位数滤波，再线性插值回原采样点。
+    step 默认为 window // 16。
+    """
+    data = np.atleast_2d(np.asarray(data, dtype=np.float64))
+    window = int(window)
+    n_cells, n = data.shape
+    if window <= 1 or n == 0:
+        return data.copy()
+    if step is None:
+        step = max(window // 16, 1)
+    n_blocks = -(-n // step)
+    pad = n_blocks * step - n
+    padded = np.pad(data, ((0, 0), (0, pad)), mode='edge') if pad else data
+    blocks = np.percentile(padded.reshape(n_cells, n_blocks, step), percentile, axis=2)
+
+    size = max(-(-window // step), 1)
+    values = np.empty_like(blocks)
+    for row in range(n_cells):
+        values[row] = ndimage.percentile_filter(blocks[row], percentile, size=size, mode='constant', cval=0.0)
+    if n_blocks == 1:
+        return np.repeat(values, n, axis=1)
+
+    # 分块中心位置；所有行共用同一组插值位置与权重
+    centers = np.arange(n_blocks) * step + (step - 1) / 2
+    t = np.arange(n)
+    idx = np.clip(np.searchsorted(centers, t, side='right') - 1, 0, n_blocks - 2)
+    weight = np.clip((t - centers[idx]) / step, 0, 1)
+    return values[:, idx] * (1 - weight) + values[:, idx + 1] * weight
+
+
+def correct_baseline(data, window, approx=False, percentile=50):
+    """
+    扣除局部基线，返回 (校正后信号, 基线)，二者均为 (神经元, 采样点) 的 float64 数组。
+
+    approx 为真时使用 approx_percentile_baseline（可指定 percentile），
+    否则使用与 medfilt1 一致的 running_median。
+    """
+    data = np.atleast_2d(np.asarray(data, dtype=np.float64))
+    if approx:
+        baseline = approx_percentile_baseline(data, window, percentile=percentile)
+    else:
+        baseline = running_median(data, window)
+    return data - baseline, baseline
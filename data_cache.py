@@ -0,0 +1,114 @@
+"""
+已解析数据的磁盘缓存。
+
+解析后的数组以 .npy 保存在源文件同目录的 .neuro_cache 文件夹中，
+键由源文件绝对路径、修改时间、文件大小和读取方式共同决定，源文件
+改动后旧缓存自然失效。缓存总大小超过上限时按最近使用时间淘汰。
+"""
+import hashlib
+import os
+
+import numpy as np
+
+CACHE_DIR_NAME = '.neuro_cache'
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3  # 每个缓存目录最多 2 GB
+
+
+def cache_key(file_path, tag=''):
+    """由路径、修改时间、大小和读取方式生成缓存键。"""
+    st = os.stat(file_path)
+    raw = f'{os.path.abspath(file_path)}|{st.st_mtime_ns}|{st.st_size}|{tag}'
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def cache_path(file_path, tag=''):
+    cache_dir = os.path.join(os.path.dirname(os.path.abspath(file_path)), CACHE_DIR_NAME)
+    return os.path.join(cache_dir, cache_key(file_path, tag) + '.npy')
+
+
+def evict(cache_dir, max_bytes=DEFAULT_MAX_BYTES, keep=None):
+    """删除最久未使用的缓存文件，直到目录总大小不超过 max_bytes，keep 指定的文件不删除。"""
+    entries = []
+    for file_name in os.listdir(cache_dir):
+        if not file_name.endswith('.npy'):
+            continue
+        path = os.path.join(cache_dir, file_name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if keep is not None and os.path.abspath(path) == os.path.abspath(keep):
+            continue
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+
+def cached_load(file_path, loader, tag='', max_bytes=DEFAULT_MAX_BYTES, mmap_mode=None):
+    """
+    读取 file_path 解析后的数组，命中缓存时直接从 .npy 读取。
+
+    参数:
+    - loader: 无参函数，缓存未命中时调用，返回 numpy 数组。
+    - tag: 区分同一文件的不同读取方式（如列、dtype）。
+    - max_bytes: 缓存目录大小上限。
+    - mmap_mode: 传给 np.load，如 'r' 表示以内存映射方式只读打开。
+    """
+    try:
+        path = cache_path(file_path, tag)
+    except OSError:
+        return loader()
+
+    if os.path.exists(path):
+        try:
+            data = np.load(path, mmap_mode=mmap_mode, allow_pickle=False)
+            # 以修改时间记录最近使用，供淘汰使用
+            os.utime(path, None)
+            return data
+        except (OSError, ValueError):
+            pass
+
+    data = loader()
+    try:
+        cache_dir = os.path.dirname(path)
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.save(f, np.asarray(data), allow_pickle=False)
+        os.replace(tmp_path, path)
+        evict(cache_dir, max_bytes, keep=path)
+    except OSError:
+        # 目录只读等情况下不使用缓存
+        pass
+    return data
+
+
+def cached_memmap(file_path, build, tag='', max_bytes=DEFAULT_MAX_BYTES):
+    """
+    以只读内存映射方式打开 file_path 解析后的缓存数组。
+
+    缓存未命中时调用 build(npy_path)，由其直接（可分块）写出 .npy 文件，
+    整个过程不需要把数据一次性读入内存。
+    """
+    path = cache_path(file_path, tag)
+    if os.path.exists(path):
+        os.utime(path, None)
+    else:
+        cache_dir = os.path.dirname(path)
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        try:
+            build(tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        evict(cache_dir, max_bytes, keep=path)
+    return np.load(path, mmap_mode='r')
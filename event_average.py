@@ -0,0 +1,117 @@
+"""
+时间窗事件的触发平均。
+
+以每个时间窗起点为事件时刻，截取 (神经元, 时间窗, 采样点) 数组（含起点前的
+基线段），计算相对基线段均值的 ΔF/F，以及每个神经元的平均曲线、SEM、
+峰值幅度、峰值潜伏期与曲线下面积，全部向量化完成，结果汇总为一张长表。
+
+ΔF/F 以基线段均值为分母，应使用未做基线扣除的原始荧光；基线均值为 0 的
+片段结果为 NaN。
+"""
+import warnings
+
+import numpy as np
+import pandas as pd
+
+
+def extract_event_tensor(fluorescence_data, t_fluo, time_windows, n_pre):
+    """
+    截取每个时间窗起点前 n_pre 个采样点到时间窗结束的信号。
+
+    片段统一截断到最短时间窗的长度；起点前不足 n_pre 个采样点或时间窗内没有
+    数据的时间窗被舍弃。返回 (tensor, kept)：tensor 形状为
+    (神经元, 时间窗, n_pre + 采样点)，kept 为保留的时间窗在 time_windows 中的索引。
+    """
+    data = np.atleast_2d(np.asarray(fluorescence_data))
+    bounds = np.asarray(time_windows, dtype=float).reshape(-1, 2)
+    start_idx = np.searchsorted(t_fluo, bounds[:, 0], side='left')
+    end_idx = np.searchsorted(t_fluo, bounds[:, 1], side='left')
+    lengths = end_idx - start_idx
+    kept = np.flatnonzero((lengths > 0) & (start_idx >= n_pre))
+    if kept.size == 0:
+        return np.empty((data.shape[0], 0, n_pre), dtype=np.float64), kept
+    n_post = lengths[kept].min()
+    sample_idx = start_idx[kept, None] + np.arange(-n_pre, n_post)
+    return data[:, sample_idx].astype(np.float64), kept
+
+
+def delta_f_over_f(tensor, n_pre):
+    """以前 n_pre 个采样点的均值 F0 计算 (F - F0) / F0，F0 为 0 时结果为 NaN。"""
+    if n_pre < 1:
+        raise ValueError("基线段至少需要 1 个采样点")
+    f0 = tensor[..., :n_pre].mean(axis=-1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(f0 != 0, (tensor - f0) / f0, np.nan)
+
+
+def event_metrics(dff, n_pre, fluo_freq):
+    """
+    计算时间窗起点之后部分的峰值、峰值潜伏期（秒，相对起点）与曲线下面积（ΔF/F·秒）。
+
+    dff 的最后一维为采样点，前面各维任意；返回三个形状与前面各维相同的数组。
+    """
+    post = dff[..., n_pre:]
+    valid = ~np.all(np.isnan(post), axis=-1)
+    filled = np.where(np.isnan(post), -np.inf, post)
+    peak_idx = np.argmax(filled, axis=-1)
+    peak = np.where(valid, np.take_along_axis(post, peak_idx[..., None], axis=-1)[..., 0], np.nan)
+    latency = np.where(valid, peak_idx / fluo_freq, np.nan)
+    # 梯形积分；NaN 会传递到对应的面积
+    if post.shape[-1] > 1:
+        auc = (post.sum(axis=-1) - (post[..., 0] + post[..., -1]) / 2) / fluo_freq
+    else:
+        auc = np.zeros(post.shape[:-1])
+    return peak, latency, auc
+
+
+def event_triggered_average(fluorescence_data, t_fluo, time_windows, fluo_freq, pre=1.0):
+    """
+    对所有神经元、所有时间窗做事件触发平均。
+
+    参数:
+    - pre: 时间窗起点前用作 ΔF/F 基线的时长（秒）。
+
+    返回字典：
+    - 'dff': (神经元, 时间窗, 采样点) 的 ΔF/F；'t': 相对时间窗起点的时间轴（秒）
+    - 'mean' / 'sem': (神经元, 采样点) 的平均曲线与标准误
+    - 'kept': 保留的时间窗索引
+    - 'table': 长表，每个神经元每个时间窗一行，另有 window 为 'mean' 的平均曲线一行，
+      列为 neuron、window、peak_dff、latency_s、auc
+    """
+    n_pre = int(round(pre * fluo_freq))
+    tensor, kept = extract_event_tensor(fluorescence_data, t_fluo, time_windows, n_pre)
+    n_neurons, n_windows, n_samples = tensor.shape
+    if n_windows == 0:
+        raise ValueError("没有起点前有足够基线数据的时间窗")
+    dff = delta_f_over_f(tensor, n_pre)
+    t = (np.arange(n_samples) - n_pre) / fluo_freq
+
+    # 全为 NaN 的神经元（F0 为 0）或只有一个时间窗时，均值/SEM 为 NaN，不需要警告
+    with warnings.catch_warnings(), np.errstate(invalid='ignore', divide='ignore'):
+        warnings.simplefilter('ignore', RuntimeWarning)
+        n_valid = np.sum(~np.isnan(dff), axis=1)
+        mean = np.nanmean(dff, axis=1)
+        sem = np.nanstd(dff, axis=1, ddof=1) / np.sqrt(n_valid)
+
+    peak, latency, auc = event_metrics(dff, n_pre, fluo_freq)
+    mean_peak, mean_latency, mean_auc = event_metrics(mean, n_pre, fluo_freq)
+
+    # 长表：先按神经元、再按时间窗展开，平均曲线附在每个神经元之后
+    window_labels = [f'window_{j + 1}' for j in kept] + ['mean']
+    table = pd.DataFrame({
+        'neuron': np.repeat(np.arange(1, n_neurons + 1), n_windows + 1),
+        'window': np.tile(window_labels, n_neurons),
+        'peak_dff': np.column_stack([peak, mean_peak]).ravel(),
+        'latency_s': np.column_stack([latency, mean_latency]).ravel(),
+        'auc': np.column_stack([auc, mean_auc]).ravel(),
+    })
+    return {'dff': dff, 't': t, 'mean': mean, 'sem': sem, 'kept': kept, 'table': table}
+
+
+def trace_frame(result):
+    """把平均曲线与 SEM 整理为以相对时间为第一列的宽表，便于写入 Excel。"""
+    columns = {'t_s': result['t']}
+    for i in range(result['mean'].shape[0]):
+        columns[f'Neuron_{i + 1}_mean'] = result['mean'][i]
+        columns[f'Neuron_{i + 1}_sem'] = result['sem'][i]
+    return pd.DataFrame(columns)
@@ -0,0 +1,261 @@
+"""
+只读取文件头获取图像宽高。
+
+数据集转换脚本只需要图像的宽和高，完整解码图像代价很高。这里直接解析
+PNG 的 IHDR 块、JPEG 的 SOF 段与 TIFF（含 BigTIFF）第一个 IFD 的宽高标签；
+JPEG 的 EXIF 方向为 5-8（旋转 90°）时交换宽高，与 cv2.imread 自动旋转后的
+shape 一致。无法识别的格式才退回用 cv2 解码。
+
+directory_sizes 把一个目录中图像的宽高保存在用户缓存目录（见 user_cache_dir）
+下该目录对应的索引里，不在数据集目录中写入任何文件；按文件修改时间与大小
+判断是否过期，重复处理同一数据集时不再读取图像。
+"""
+import hashlib
+import io
+import json
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+# 带尺寸信息的 JPEG SOF 段（不含 DHT 0xC4、JPG 0xC8、DAC 0xCC）
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+EXIF_ORIENTATION_TAG = 0x0112
+TIFF_WIDTH_TAG = 256
+TIFF_HEIGHT_TAG = 257
+# TIFF 字段类型: 编号 -> (struct 格式, 字节数)，只列出尺寸与方向标签可能用到的整数类型
+TIFF_TYPES = {3: ('H', 2), 4: ('I', 4), 16: ('Q', 8)}
+IMAGE_SUFFIXES = ('.png', '.jpg', '.jpeg', '.tif', '.tiff', '.bmp')
+CACHE_APP_NAME = 'neuro-tools'
+PROBE_WORKERS = 8  # 读取文件头的线程数
+
+
+def image_size(image_path):
+    """
+    返回图像的 (宽度, 高度)。
+
+    先按文件头解析，无法识别时用 cv2 解码；都失败时抛出 ValueError。
+    """
+    with open(image_path, 'rb') as f:
+        head = f.read(32)
+        f.seek(0)
+        size = None
+        if head.startswith(PNG_SIGNATURE):
+            size = _png_size(head)
+        elif head.startswith(b'\xff\xd8'):
+            size = _jpeg_size(f)
+        elif head[:4] in (b'II*\x00', b'MM\x00*', b'II+\x00', b'MM\x00+'):
+            size = _tiff_size(f)
+    if size is not None:
+        return size
+    return _decode_size(image_path)
+
+
+def _png_size(head):
+    # 签名后第一个块必须是 IHDR：长度(4) 类型(4) 宽(4) 高(4)
+    if len(head) < 24 or head[12:16] != b'IHDR':
+        return None
+    width, height = struct.unpack('>II', head[16:24])
+    return width, height
+
+
+def _jpeg_size(f):
+    """逐段跳过 JPEG 标记，读到 SOF 段为止；记录途中 APP1 里的 EXIF 方向。"""
+    f.read(2)  # SOI
+    orientation = 1
+    while True:
+        byte = f.read(1)
+        if not byte:
+            return None
+        if byte != b'\xff':
+            continue
+        marker = f.read(1)
+        while marker == b'\xff':  # 填充字节
+            marker = f.read(1)
+        if not marker:
+            return None
+        code = marker[0]
+        if code == 0xD8 or code == 0x01 or 0xD0 <= code <= 0xD7:
+            continue  # 无长度字段的独立标记
+        if code in (0xD9, 0xDA):  # EOI / SOS 之前仍未找到 SOF
+            return None
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            return None
+        length = struct.unpack('>H', length_bytes)[0]
+        if length < 2:
+            return None
+        if code in JPEG_SOF_MARKERS:
+            data = f.read(5)
+            if len(data) < 5:
+                return None
+            height, width = struct.unpack('>HH', data[1:5])
+            if orientation in (5, 6, 7, 8):
+                width, height = height, width
+            return width, height
+        segment = f.read(length - 2)
+        if code == 0xE1 and segment.startswith(b'Exif\x00\x00'):
+            orientation = _exif_orientation(segment[6:]) or orientation
+
+
+def _exif_orientation(tiff):
+    """从 EXIF 的 TIFF 结构中读取 IFD0 的方向标签，读不到时返回 None。"""
+    try:
+        return _read_ifd0(io.BytesIO(tiff), (EXIF_ORIENTATION_TAG,)).get(EXIF_ORIENTATION_TAG)
+    except (struct.error, ValueError):
+        return None
+
+
+def _tiff_size(f):
+    """TIFF 第一个 IFD（多页堆栈的第一页）的宽高。"""
+    try:
+        tags = _read_ifd0(f, (TIFF_WIDTH_TAG, TIFF_HEIGHT_TAG))
+    except (struct.error, ValueError):
+        return None
+    if TIFF_WIDTH_TAG not in tags or TIFF_HEIGHT_TAG not in tags:
+        return None
+    return tags[TIFF_WIDTH_TAG], tags[TIFF_HEIGHT_TAG]
+
+
+def _read_ifd0(f, wanted):
+    """
+    从文件开头的 TIFF 头定位第一个 IFD，返回 wanted 中各标签的整数值。
+
+    只支持单个整数值的标签。IFD 项为 标签(2) 类型(2) 个数 值，经典 TIFF 中个数与值
+    各 4 字节，BigTIFF 中各 8 字节。
+    """
+    header = f.read(16)
+    if header[:2] not in (b'II', b'MM'):
+        raise ValueError('不是 TIFF 结构')
+    endian = '<' if header[:2] == b'II' else '>'
+    version = struct.unpack(endian + 'H', header[2:4])[0]
+    if version == 43:  # BigTIFF
+        offset = struct.unpack(endian + 'Q', header[8:16])[0]
+        count_fmt, entry_size, value_size = 'Q', 20, 8
+    else:
+        offset = struct.unpack(endian + 'I', header[4:8])[0]
+        count_fmt, entry_size, value_size = 'H', 12, 4
+    count_size = struct.calcsize(count_fmt)
+    f.seek(offset)
+    n_entries = struct.unpack(endian + count_fmt, f.read(count_size))[0]
+    entries = f.read(n_entries * entry_size)
+    values = {}
+    for i in range(len(entries) // entry_size):
+        entry = entries[i * entry_size:(i + 1) * entry_size]
+        tag, field_type = struct.unpack(endian + 'HH', entry[:4])
+        if tag not in wanted or field_type not in TIFF_TYPES:
+            continue
+        fmt, size = TIFF_TYPES[field_type]
+        if size > value_size:
+            continue
+        values[tag] = struct.unpack(endian + fmt, entry[4 + value_size:4 + value_size + size])[0]
+    return values
+
+
+def _decode_size(image_path):
+    if cv2 is None:
+        raise ValueError(f'无法从文件头识别图像尺寸，且未安装 opencv: {image_path}')
+    image = cv2.imdecode(np.fromfile(image_path, np.uint8), cv2.IMREAD_UNCHANGED)
+    if image is None:
+        raise ValueError(f'无法读取图像: {image_path}')
+    return image.shape[1], image.shape[0]
+
+
+def user_cache_dir():
+    """尺寸索引的默认保存位置：Windows 为 %LOCALAPPDATA%，其他系统为 $XDG_CACHE_HOME 或 ~/.cache。"""
+    base = os.environ.get('LOCALAPPDATA') if os.name == 'nt' else os.environ.get('XDG_CACHE_HOME')
+    if not base:
+        base = os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, CACHE_APP_NAME, 'imgsize')
+
+
+def _index_path(directory, cache_dir=None):
+    """索引文件名由图像目录的绝对路径决定，不同数据集互不影响。"""
+    key = hashlib.sha1(os.path.abspath(directory).encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir or user_cache_dir(), f'{key}.json')
+
+
+def load_index(directory, cache_dir=None):
+    """读取目录的尺寸索引：{文件名: [修改时间 ns, 文件大小, 宽, 高]}，不存在或损坏时返回空字典。"""
+    try:
+        with open(_index_path(directory, cache_dir), 'r', encoding='utf-8') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return index if isinstance(index, dict) else {}
+
+
+def save_index(directory, index, cache_dir=None):
+    """原子地写出尺寸索引；缓存目录不可写时不保存。"""
+    path = _index_path(directory, cache_dir)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
+
+
+def directory_sizes(directory, names=None, workers=PROBE_WORKERS, cache_dir=None):
+    """
+    返回目录中图像的尺寸字典 {文件名: (宽, 高)}。
+
+    参数:
+    - names: 需要的文件名列表，默认为目录中所有 IMAGE_SUFFIXES 后缀的文件。
+    - workers: 读取文件头的线程数。
+    - cache_dir: 索引的保存目录，默认为 user_cache_dir()。
+
+    索引中修改时间与大小都未变的文件直接使用缓存的尺寸，其余文件并行读取
+    文件头后写回索引。不存在或无法读取的文件不出现在结果中。
+    """
+    if names is None:
+        names = [name for name in os.listdir(directory) if name.lower().endswith(IMAGE_SUFFIXES)]
+    index = load_index(directory, cache_dir)
+    sizes = {}
+    pending = []
+    for name in names:
+        try:
+            st = os.stat(os.path.join(directory, name))
+        except OSError:
+            continue
+        entry = index.get(name)
+        if entry is not None and entry[:2] == [st.st_mtime_ns, st.st_size]:
+            sizes[name] = (entry[2], entry[3])
+        else:
+            pending.append((name, st))
+    if not pending:
+        return sizes
+
+    def probe(item):
+        name, st = item
+        try:
+            return name, st, image_size(os.path.join(directory, name))
+        except (OSError, ValueError):
+            return name, st, None
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for name, st, size in executor.map(probe, pending):
+            if size is None:
+                continue
+            sizes[name] = size
+            index[name] = [st.st_mtime_ns, st.st_size, size[0], size[1]]
+    save_index(directory, index, cache_dir)
+    return sizes
+
+
+def cached_image_size(image_path):
+    """单个文件的尺寸，经由所在目录的索引；批量处理时应直接调用 directory_sizes。"""
+    directory, name = os.path.split(os.path.abspath(image_path))
+    sizes = directory_sizes(directory, [name], workers=1)
+    if name not in sizes:
+        raise ValueError(f'无法读取图像: {image_path}')
+    return sizes[name]
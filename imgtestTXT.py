@@ -1,6 +1,7 @@
 import os
 import glob
-import cv2
+
+import imgsize
 # 设置输入目标图像目录和GT TXT目录
 img_folder = "/public/xu/deeplearning/ultralytics-yolo11-main/dataset/Neuron_x2/train/images"  # 目标图像文件夹
 gt_folder = "/public/xu/deeplearning/ultralytics-yolo11-main/dataset/Neuron_x2/train/labels"  # YOLO 格式 GT 文件夹
@@ -9,11 +10,16 @@ gt_folder = "/public/xu/deeplearning/ultralytics-yolo11-main/dataset/Neuron_x2/t
 img_files = sorted(glob.glob(os.path.join(img_folder, "*.png")))  # 假设图像是PNG格式
 gt_files = sorted(glob.glob(os.path.join(gt_folder, "*.txt")))  # 假设GT是TXT格式
 
+# 只读取文件头获取图像尺寸，结果缓存在图像目录的索引中
+image_sizes = imgsize.directory_sizes(img_folder, [os.path.basename(f) for f in img_files])
+
 # 检查图像和GT尺寸是否一致
 for img_path, gt_path in zip(img_files, gt_files):
-    # 读取目标图像
-    img = cv2.imread(img_path)
-    img_h, img_w, _ = img.shape  # 获取图像的高度和宽度
+    # 获取图像的宽度和高度
+    if os.path.basename(img_path) not in image_sizes:
+        print(f"Error: Cannot read image {img_path}")
+        continue
+    img_w, img_h = image_sizes[os.path.basename(img_path)]
 
     # 读取YOLO格式GT文件
     with open(gt_path, 'r') as f:
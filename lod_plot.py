@@ -0,0 +1,134 @@
+"""
+长时间序列的分级降采样绘图。
+
+对均匀采样的信号预先计算多分辨率的最小/最大值金字塔，绘图时只输出约与
+像素数相当的点：每个像素区间保留其中的最小值和最大值（按出现的先后顺序，
+并使用它们真实的采样时间），因此峰值位置与原始数据完全一致。
+坐标轴缩放或平移时根据新的显示范围从金字塔中重新取数据。
+"""
+import numpy as np
+
+
+class MinMaxPyramid:
+    """
+    均匀采样信号的最小/最大值金字塔。
+
+    第 k 层每个桶覆盖 factor**k 个原始采样点，保存桶内最小值、最大值的原始索引。
+    """
+
+    def __init__(self, y, factor=4, min_bins=512):
+        self.y = np.asarray(y)
+        self.factor = factor
+        self.levels = []  # [(最小值索引, 最大值索引), ...]，第 i 项对应第 i + 1 层
+        idx_dtype = np.int32 if len(self.y) < 2 ** 31 else np.int64
+
+        if len(self.y) < factor * min_bins:
+            return
+        # 第 1 层直接由原始数据得到
+        imin, imax = self._reduce_raw(self.y, factor, idx_dtype)
+        while len(imin) >= min_bins:
+            self.levels.append((imin, imax))
+            imin, imax = self._reduce_level(self.y, imin, imax, factor)
+
+    @staticmethod
+    def _reduce_raw(y, factor, idx_dtype):
+        n_bins = -(-len(y) // factor)
+        pad = n_bins * factor - len(y)
+        y_pad = np.concatenate([y, np.full(pad, y[-1] if len(y) else 0, dtype=y.dtype)]) if pad else y
+        blocks = y_pad.reshape(n_bins, factor)
+        offsets = np.arange(n_bins, dtype=idx_dtype) * factor
+        imin = offsets + np.argmin(blocks, axis=1).astype(idx_dtype)
+        imax = offsets + np.argmax(blocks, axis=1).astype(idx_dtype)
+        np.minimum(imin, len(y) - 1, out=imin)
+        np.minimum(imax, len(y) - 1, out=imax)
+        return imin, imax
+
+    @staticmethod
+    def _reduce_level(y, imin, imax, factor):
+        n_bins = -(-len(imin) // factor)
+        pad = n_bins * factor - len(imin)
+        if pad:
+            imin = np.concatenate([imin, np.repeat(imin[-1:], pad)])
+            imax = np.concatenate([imax, np.repeat(imax[-1:], pad)])
+        imin = imin.reshape(n_bins, factor)
+        imax = imax.reshape(n_bins, factor)
+        rows = np.arange(n_bins)
+        new_min = imin[rows, np.argmin(y[imin], axis=1)]
+        new_max = imax[rows, np.argmax(y[imax], axis=1)]
+        return new_min, new_max
+
+    def indices(self, i0, i1, n_pixels):
+        """
+        返回 [i0, i1) 范围内用于绘图的原始采样索引（升序）。
+
+        点数不超过约 2 * n_pixels 时直接返回全部索引。
+        """
+        n_samples = i1 - i0
+        if n_samples <= 2 * n_pixels or not self.levels:
+            return np.arange(i0, i1)
+        # 选择桶数仍不少于像素数的最粗一层
+        level = 0
+        while level < len(self.levels) and n_samples / self.factor ** (level + 1) >= n_pixels:
+            level += 1
+        if level == 0:
+            return np.arange(i0, i1)
+        bin_size = self.factor ** level
+        imin, imax = self.levels[level - 1]
+        # 完整落在范围内的桶使用金字塔，两端不完整的桶直接在原始数据上求极值
+        b0 = -(-i0 // bin_size)
+        b1 = i1 // bin_size
+        lo = imin[b0:b1]
+        hi = imax[b0:b1]
+        pairs = np.empty(2 * len(lo), dtype=np.int64)
+        pairs[0::2] = np.minimum(lo, hi)
+        pairs[1::2] = np.maximum(lo, hi)
+        head = self._extrema(i0, min(b0 * bin_size, i1))
+        tail = self._extrema(max(b1 * bin_size, i0), i1)
+        return np.concatenate([[i0], head, pairs, tail, [i1 - 1]])
+
+    def _extrema(self, i0, i1):
+        """[i0, i1) 内最小值与最大值的索引，按先后顺序排列。"""
+        if i1 <= i0:
+            return np.empty(0, dtype=np.int64)
+        seg = self.y[i0:i1]
+        return i0 + np.sort([np.argmin(seg), np.argmax(seg)])
+
+
+class DecimatedLine:
+    """
+    在坐标轴上绘制按显示范围降采样的折线。
+
+    t 为均匀的时间轴，坐标轴 x 范围变化时自动更新折线数据。pyramid 可传入
+    预先（如在后台线程中）由 y 构建的 MinMaxPyramid。
+    """
+
+    def __init__(self, ax, t, y, *args, pyramid=None, **kwargs):
+        self.ax = ax
+        self.t = np.asarray(t)
+        self.y = np.asarray(y)
+        self.pyramid = pyramid if pyramid is not None else MinMaxPyramid(self.y)
+        idx = self._visible_indices(0, len(self.t))
+        self.line, = ax.plot(self.t[idx], self.y[idx], *args, **kwargs)
+        self._cid = ax.callbacks.connect('xlim_changed', self._on_xlim_changed)
+
+    def _n_pixels(self):
+        return max(int(self.ax.bbox.width), 100)
+
+    def _visible_indices(self, i0, i1):
+        return self.pyramid.indices(i0, i1, self._n_pixels())
+
+    def _on_xlim_changed(self, ax):
+        if len(self.t) < 2:
+            return
+        x0, x1 = ax.get_xlim()
+        # 多取一个点，使折线延伸到显示区域边缘
+        i0 = max(int(np.searchsorted(self.t, x0, side='left')) - 1, 0)
+        i1 = min(int(np.searchsorted(self.t, x1, side='right')) + 1, len(self.t))
+        if i1 <= i0:
+            return
+        idx = self._visible_indices(i0, i1)
+        self.line.set_data(self.t[idx], self.y[idx])
+
+    def remove(self):
+        self.ax.callbacks.disconnect(self._cid)
+        self.line.remove()
@@ -0,0 +1,160 @@
+"""
+压力/荧光数据批处理命令行。
+
+在输入目录中按文件名后缀配对压力文件与荧光文件（如 mouse1_pressure.txt 与
+mouse1_fluo.txt），使用进程池并行处理，每对文件写出一个分段结果文件。
+
+示例:
+    python pc_batch.py data/ -o results/ --window 5 --workers 8
+    python pc_batch.py data/ -o results/ --from_sessions --format npz
+"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import event_average
+import pc_core
+
+DATA_EXTS = ('.txt', '.xlsx')
+
+
+def find_pairs(input_dir, pressure_suffix='_pressure', fluo_suffix='_fluo'):
+    """
+    在目录中查找成对的压力/荧光文件，返回 [(名称, 压力文件, 荧光文件), ...]。
+    """
+    pressure_files = {}
+    fluo_files = {}
+    for file_name in sorted(os.listdir(input_dir)):
+        stem, ext = os.path.splitext(file_name)
+        if ext.lower() not in DATA_EXTS:
+            continue
+        path = os.path.join(input_dir, file_name)
+        if stem.endswith(pressure_suffix):
+            pressure_files[stem[:-len(pressure_suffix)]] = path
+        elif stem.endswith(fluo_suffix):
+            fluo_files[stem[:-len(fluo_suffix)]] = path
+    pairs = []
+    for name in sorted(pressure_files):
+        if name in fluo_files:
+            pairs.append((name, pressure_files[name], fluo_files[name]))
+        else:
+            print(f'未找到对应荧光文件: {pressure_files[name]}')
+    return pairs
+
+
+def process_pair(name, pressure_file, fluorescence_file, output_dir, pressure_freq, fluo_freq,
+                 window_len, fmt, refractory=None, merge_gap=0.0, chunk_size=None,
+                 baseline_window=None, approx_baseline=False, pre_window=None, from_session=False):
+    """
+    处理一对文件：检测二阶差分峰值，按不应期/合并规则生成时间窗并写出分段结果。
+    指定 chunk_size 时压力数据分块滤波，内存占用与记录长度无关；
+    指定 baseline_window（秒）时分段前先扣除荧光的滑动中值基线；指定 pre_window（秒）
+    时以时间窗起点前该时长为基线计算 ΔF/F 触发平均，并写出汇总表。ΔF/F 始终用未扣除
+    基线的原始荧光计算（扣除后 F0 接近 0）。
+
+    from_session 为真时改用会话文件（见 pc_core.save_session）中保存的时间窗、荧光
+    采样率与基线参数，不再读取和处理压力数据；没有匹配的会话文件时报错。
+    返回 (名称, 输出文件, 时间窗数量)。
+    """
+    if from_session:
+        session = pc_core.load_session(pressure_file, fluorescence_file)
+        if session is None:
+            raise ValueError(f'没有与数据文件匹配的会话文件: {pc_core.session_path(fluorescence_file)}')
+        pressure_freq, fluo_freq = session['pressure_freq'], session['fluo_freq']
+        time_windows = session['time_windows']
+        window_len = session.get('window_len', window_len)
+        refractory = session.get('refractory', refractory)
+        merge_gap = session.get('merge_gap', merge_gap)
+        baseline_window = session.get('baseline_window', baseline_window)
+        approx_baseline = session.get('approx_baseline', approx_baseline)
+        pre_window = pre_window or session.get('pre_window')
+        raw_fluorescence, t_fluo = pc_core.load_fluorescence(fluorescence_file, fluo_freq)
+        fluorescence_data = raw_fluorescence
+        if baseline_window:
+            fluorescence_data = pc_core.correct_fluorescence_baseline(raw_fluorescence, fluo_freq, baseline_window,
+                                                                      approx=approx_baseline)
+    else:
+        with tempfile.TemporaryDirectory(prefix='pc_batch_') as workdir:
+            result = pc_core.analyze_pair(pressure_file, fluorescence_file, pressure_freq, fluo_freq,
+                                          chunk_size=chunk_size, workdir=workdir,
+                                          baseline_window=baseline_window, approx_baseline=approx_baseline)
+            time_peaks = result['time_peaks']
+            fluorescence_data, t_fluo = result['fluorescence_data'], result['t_fluo']
+            raw_fluorescence = result['raw_fluorescence']
+            # 释放内存映射，临时目录才能被删除
+            del result
+        time_windows = pc_core.peaks_to_windows(time_peaks, window_len, refractory=refractory,
+                                                merge_gap=merge_gap, t_max=t_fluo[-1])
+    segments, kept = pc_core.extract_windows(fluorescence_data, t_fluo, time_windows)
+    metadata = pc_core.session_metadata(pressure_file, fluorescence_file, pressure_freq, fluo_freq,
+                                        [time_windows[k] for k in kept], window_len=window_len,
+                                        refractory=refractory, merge_gap=merge_gap,
+                                        baseline_window=baseline_window, approx_baseline=approx_baseline)
+    summary = None
+    if pre_window:
+        summary = event_average.event_triggered_average(raw_fluorescence, t_fluo, time_windows,
+                                                        fluo_freq, pre=pre_window)
+    output_file = os.path.join(output_dir, f'{name}_segments.{fmt}')
+    pc_core.write_segments(output_file, segments, summary=summary, metadata=metadata)
+    return name, output_file, segments.shape[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='批量处理压力/荧光数据对')
+    parser.add_argument('input_dir', type=str, help='包含压力/荧光文件对的目录')
+    parser.add_argument('-o', '--output_dir', default='segments', type=str, help='分段结果输出目录')
+    parser.add_argument('--pressure_suffix', default='_pressure', type=str, help='压力文件名后缀')
+    parser.add_argument('--fluo_suffix', default='_fluo', type=str, help='荧光文件名后缀')
+    parser.add_argument('--pressure_freq', default=800.0, type=float, help='压力采样频率(Hz)')
+    parser.add_argument('--fluo_freq', default=40.0, type=float, help='荧光采样频率(Hz)')
+    parser.add_argument('--window', default=5.0, type=float, help='时间窗口(秒)')
+    parser.add_argument('--refractory', default=None, type=float, help='时间窗起点最小间隔(秒)，默认等于时间窗口')
+    parser.add_argument('--merge_gap', default=0.0, type=float, help='间隔小于该值(秒)的峰合并为一个事件')
+    parser.add_argument('--chunk_size', default=None, type=int,
+                        help='分块滤波的每块采样点数，用于超长压力记录；默认整段滤波')
+    parser.add_argument('--baseline_window', default=None, type=float,
+                        help='荧光基线校正的滑动中值窗口(秒)，默认不校正')
+    parser.add_argument('--approx_baseline', action='store_true', help='使用近似的分块分位数基线，速度更快')
+    parser.add_argument('--pre_window', default=None, type=float,
+                        help='ΔF/F 基线时长(秒，取时间窗起点之前)，指定时输出触发平均汇总；始终使用未扣除基线的荧光')
+    parser.add_argument('--from_sessions', action='store_true',
+                        help='使用图形界面保存的会话文件中的时间窗与参数重新导出，不处理压力数据')
+    parser.add_argument('--format', default='xlsx', choices=pc_core.SEGMENT_FORMATS,
+                        help='输出格式，大数据量建议使用 npz/parquet/h5')
+    parser.add_argument('--workers', default=None, type=int, help='进程数，默认为 CPU 核数')
+    arg = parser.parse_args()
+
+    pairs = find_pairs(arg.input_dir, arg.pressure_suffix, arg.fluo_suffix)
+    if not pairs:
+        print(f'{arg.input_dir} 中没有找到文件对')
+        return
+    os.makedirs(arg.output_dir, exist_ok=True)
+
+    start_time = time.time()
+    error_file_list = []
+    with ProcessPoolExecutor(max_workers=arg.workers) as executor:
+        futures = {
+            executor.submit(process_pair, name, pressure_file, fluo_file, arg.output_dir,
+                            arg.pressure_freq, arg.fluo_freq, arg.window, arg.format,
+                            arg.refractory, arg.merge_gap, arg.chunk_size,
+                            arg.baseline_window, arg.approx_baseline, arg.pre_window,
+                            arg.from_sessions): name
+            for name, pressure_file, fluo_file in pairs
+        }
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                _, output_file, n_windows = future.result()
+                print(f'{name}: {n_windows} 个时间窗 -> {output_file}')
+            except Exception as e:
+                print(f'{name} 处理失败.\nerror message:\n{e}')
+                error_file_list.append(name)
+    print(f'共处理 {len(pairs)} 对文件，用时 {time.time() - start_time:.1f} 秒')
+    if error_file_list:
+        print(f'处理失败的文件对:\n{error_file_list}')
+
+
+if __name__ == '__main__':
+    main()
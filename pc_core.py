@@ -0,0 +1,547 @@
+"""
+压力/荧光数据分析核心（不依赖 Tk）。
+
+P-C_analysis_new.py 中的图形界面与 pc_batch.py 批处理命令行共用这里的
+读取、滤波、二阶差分峰值检测与时间窗分段逻辑。
+"""
+import hashlib
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+from scipy.signal import butter, filtfilt, find_peaks
+
+import baseline
+import data_cache
+import event_average
+import stream_filter
+
+
+try:
+    import pyarrow.csv as pa_csv
+except ImportError:
+    pa_csv = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+SNIFF_BYTES = 64 * 1024
+SNIFF_LINES = 20  # 判断分隔符时检查的数据行数
+SEGMENT_FORMATS = ('xlsx', 'txt', 'npz', 'parquet', 'h5')
+PARQUET_ROW_GROUP = 1 << 20  # Parquet 每个行组的大致行数，按神经元对齐
+SESSION_SUFFIX = '.session.json'  # 会话文件与荧光文件同目录同名
+HASH_CHUNK = 1 << 20
+
+_sha1_cache = {}  # (绝对路径, 修改时间, 大小) -> SHA-1
+
+
+def _is_header(tokens):
+    """超过一半的值无法转换为数值时，认为该行为表头。"""
+    n_text = 0
+    for token in tokens:
+        try:
+            float(token)
+        except ValueError:
+            n_text += 1
+    return n_text >= len(tokens) / 2
+
+
+def sniff_text_format(file_path):
+    """
+    读取文件开头几 KB，判断分隔符与是否有表头。
+
+    返回 (分隔符, 是否有表头)，分隔符为 None 表示任意空白。第一行是否为表头
+    按任意逗号/分号/空白切分后判断，与分隔符无关；逗号、制表符或分号只有在
+    把每一个采样数据行（无表头时包括第一行）切成相同列数时才采用，否则按任意
+    空白切分。
+    """
+    with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+        sample = f.read(SNIFF_BYTES)
+    lines = [line for line in sample.splitlines() if line.strip()]
+    if len(sample) == SNIFF_BYTES and len(lines) > 1:
+        lines = lines[:-1]  # 最后一行可能被截断
+    if not lines:
+        raise ValueError(f"文件为空: {file_path}")
+    has_header = _is_header(re.split(r'[,;\s]+', lines[0].strip()))
+    data_lines = (lines[1:] if has_header else lines)[:SNIFF_LINES]
+    delimiter = None
+    for candidate in (',', '\t', ';'):
+        if data_lines and len({len(line.split(candidate)) for line in data_lines}) == 1 \
+                and candidate in data_lines[0]:
+            delimiter = candidate
+            break
+    return delimiter, has_header
+
+
+def _parse_text(file_path, delimiter, has_header, dtype):
+    """按已知分隔符用 C 实现的解析器读入二维数组，非数值记为 NaN。"""
+    skip_rows = 1 if has_header else 0
+    if pa_csv is not None and delimiter is not None:
+        try:
+            table = pa_csv.read_csv(
+                file_path,
+                read_options=pa_csv.ReadOptions(skip_rows=skip_rows, autogenerate_column_names=True),
+                parse_options=pa_csv.ParseOptions(delimiter=delimiter))
+            return np.column_stack([column.to_numpy(zero_copy_only=False).astype(dtype, copy=False)
+                                    for column in table.columns])
+        except Exception:
+            pass
+    sep = delimiter if delimiter is not None else r'\s+'
+    try:
+        df = pd.read_csv(file_path, sep=sep, header=None, skiprows=skip_rows, dtype=dtype, engine='c')
+    except ValueError:
+        # 存在无法解析的值时退回逐列转换
+        df = pd.read_csv(file_path, sep=sep, header=None, skiprows=skip_rows, dtype=str, engine='c')
+        df = df.apply(pd.to_numeric, errors='coerce')
+    return df.to_numpy(dtype=dtype)
+
+
+def load_matrix(file_path, dtype=np.float32, use_cache=True):
+    """
+    读取 txt/xlsx 数据文件为连续的二维数组（行为采样点，列为通道）。
+
+    文本文件先读取开头几 KB 判断分隔符与表头，再直接解析为数值数组；
+    安装 pyarrow 时优先使用其 CSV 读取器。表头判断规则与原 read_file 相同：
+    第一行中超过一半的值无法转换为数值时丢弃该行。
+    use_cache 为 True 时解析结果缓存为 .npy，见 data_cache。
+    """
+    if use_cache:
+        return data_cache.cached_load(file_path, lambda: load_matrix(file_path, dtype, use_cache=False),
+                                      tag=f'matrix-v2-{np.dtype(dtype).name}')
+    if file_path.endswith('.xlsx'):
+        df = pd.read_excel(file_path, header=None)
+        if _is_header([str(value) for value in df.iloc[0]]):
+            df = df.iloc[1:]
+        data = df.apply(pd.to_numeric, errors='coerce').to_numpy(dtype=dtype)
+    else:
+        delimiter, has_header = sniff_text_format(file_path)
+        data = _parse_text(file_path, delimiter, has_header, dtype)
+    return np.ascontiguousarray(np.atleast_2d(data), dtype=dtype)
+
+
+def convert_text_to_npy(file_path, npy_path, dtype=np.float64, chunk_rows=1_000_000):
+    """
+    分块解析文本数据文件并写成 .npy，内存占用只与 chunk_rows 有关。
+
+    各块先顺序写入临时的原始二进制文件，行数确定后再逐块拷贝到 .npy 中。
+    """
+    delimiter, has_header = sniff_text_format(file_path)
+    sep = delimiter if delimiter is not None else r'\s+'
+    raw_path = npy_path + '.raw'
+    n_rows = 0
+    n_cols = None
+    try:
+        with open(raw_path, 'wb') as raw:
+            reader = pd.read_csv(file_path, sep=sep, header=None, skiprows=1 if has_header else 0,
+                                 chunksize=chunk_rows, engine='c')
+            for chunk in reader:
+                block = np.ascontiguousarray(chunk.apply(pd.to_numeric, errors='coerce').to_numpy(dtype=dtype))
+                if n_cols is None:
+                    n_cols = block.shape[1]
+                elif block.shape[1] != n_cols:
+                    raise ValueError(f"列数不一致: {file_path}")
+                block.tofile(raw)
+                n_rows += block.shape[0]
+        if n_cols is None:
+            raise ValueError(f"文件为空: {file_path}")
+        src = np.memmap(raw_path, dtype=dtype, mode='r', shape=(n_rows, n_cols))
+        dst = np.lib.format.open_memmap(npy_path, mode='w+', dtype=dtype, shape=(n_rows, n_cols))
+        for start in range(0, n_rows, chunk_rows):
+            dst[start:start + chunk_rows] = src[start:start + chunk_rows]
+        dst.flush()
+        del src, dst
+    finally:
+        if os.path.exists(raw_path):
+            os.remove(raw_path)
+
+
+def load_matrix_mmap(file_path, dtype=np.float64):
+    """
+    以只读内存映射方式读取数据文件，首次读取时分块转换为 .npy 缓存，见 data_cache。
+    """
+    def build(npy_path):
+        if file_path.endswith('.xlsx'):
+            with open(npy_path, 'wb') as f:
+                np.save(f, load_matrix(file_path, dtype, use_cache=False))
+        else:
+            convert_text_to_npy(file_path, npy_path, dtype)
+    return data_cache.cached_memmap(file_path, build, tag=f'mmap-v2-{np.dtype(dtype).name}')
+
+
+def load_pressure(file_path, pressure_freq, mmap=False):
+    """
+    读取压力文件，返回 (电刺激, 压力, 时间轴)。
+    第 2 列为电刺激信号，第 3 列为压力数据。
+    压力需要求二阶差分，因此以 float64 读取以保留精度。
+
+    mmap 为 True 时电刺激与压力为内存映射数组的列视图，不生成时间轴（返回 None），
+    用于无法整体读入内存的超长记录。
+    """
+    if mmap:
+        data = load_matrix_mmap(file_path, dtype=np.float64)
+    else:
+        data = load_matrix(file_path, dtype=np.float64)
+    if data.ndim != 2 or data.shape[1] < 3:
+        raise ValueError("压力文件数据列数不足3列")
+    if mmap:
+        return data[:, 1], data[:, 2], None
+    electrical_stim = data[:, 1].copy()
+    pressure_coef = data[:, 2].copy()
+    t_pressure = np.arange(len(electrical_stim)) / pressure_freq
+    return electrical_stim, pressure_coef, t_pressure
+
+
+def load_fluorescence(file_path, fluo_freq):
+    """
+    读取荧光文件，每一列代表一个神经元。
+
+    返回 (荧光数据, 时间轴)，荧光数据为 (神经元, 采样点) 的连续 float32 数组。
+    """
+    data = load_matrix(file_path, dtype=np.float32)
+    fluorescence_data = np.ascontiguousarray(data.T)
+    t_fluo = np.arange(data.shape[0]) / fluo_freq
+    return fluorescence_data, t_fluo
+
+
+def correct_fluorescence_baseline(fluorescence_data, fluo_freq, baseline_window, approx=False):
+    """
+    扣除每个神经元的滑动中值基线（窗口 baseline_window 秒），返回 float32 数组。
+    approx 为真时使用近似的分块分位数基线。
+    """
+    window = int(np.floor(baseline_window * fluo_freq))
+    corrected, _ = baseline.correct_baseline(fluorescence_data, window, approx=approx)
+    return corrected.astype(np.float32)
+
+
+def pressure_second_difference(pressure_coef, pressure_freq, filter_hz=1.0, order=3):
+    """
+    对压力数据做零相位 Butterworth 低通滤波，再求二阶差分。
+
+    返回 (滤波压力, 二阶差分, 二阶差分时间轴)。
+    """
+    Wn = filter_hz / (pressure_freq / 2)
+    b, a = butter(order, Wn, btype='low')
+    filteredPressure = filtfilt(b, a, pressure_coef)
+    pressureDiff = np.diff(filteredPressure)
+    pressureDiff2 = np.diff(pressureDiff)
+    time_diff2 = np.arange(len(pressureDiff2)) / pressure_freq
+    return filteredPressure, pressureDiff2, time_diff2
+
+
+def detect_diff2_peaks(pressureDiff2, time_diff2, height=2):
+    """
+    在放大 1e6 倍的二阶差分上检测峰值，返回 (峰值索引, 峰值时间)。
+    """
+    peaks, _ = find_peaks(pressureDiff2 * 1e6, height=height)
+    return peaks, time_diff2[peaks]
+
+
+def peaks_to_windows(time_peaks, window_len, refractory=None, merge_gap=0.0, t_max=None):
+    """
+    将检测到的二阶差分峰值时间转换为时间窗 [(start, start + window_len), ...]。
+
+    参数:
+    - time_peaks: 升序的峰值时间（秒）。
+    - window_len: 时间窗长度（秒）。
+    - merge_gap: 间隔小于该值的相邻峰视为同一事件，只保留该组第一个峰。
+    - refractory: 不应期（秒），距上一个时间窗起点不足该值的峰被丢弃，默认等于 window_len，
+      即时间窗互不重叠。
+    - t_max: 记录结束时间，超出记录范围的时间窗被丢弃。
+    """
+    time_peaks = np.asarray(time_peaks, dtype=float)
+    if time_peaks.size == 0:
+        return []
+    if refractory is None:
+        refractory = window_len
+
+    # 合并成簇的峰：与前一个峰间隔不小于 merge_gap 的峰为新事件的起点
+    if merge_gap > 0:
+        is_first = np.r_[True, np.diff(time_peaks) >= merge_gap]
+        time_peaks = time_peaks[is_first]
+
+    # 不应期：每次跳到第一个距当前起点不少于 refractory 的峰
+    starts = []
+    idx = 0
+    while idx < len(time_peaks):
+        starts.append(time_peaks[idx])
+        idx = max(idx + 1, np.searchsorted(time_peaks, time_peaks[idx] + refractory, side='left'))
+    starts = np.asarray(starts)
+
+    if t_max is not None:
+        starts = starts[starts + window_len <= t_max]
+    return [(float(start), float(start + window_len)) for start in starts]
+
+
+def extract_windows(fluorescence_data, t_fluo, time_windows):
+    """
+    一次性截取所有神经元在所有时间窗内的信号。
+
+    t_fluo 为升序时间轴，时间窗边界用 np.searchsorted 一次求出，
+    每个片段为 [start, end) 内的采样点，统一截断到最短时间窗的长度。
+
+    返回 (segments, kept)：segments 形状为 (神经元, 时间窗, 采样点)，
+    kept 为保留下来的（非空）时间窗在 time_windows 中的索引。
+    """
+    data = np.atleast_2d(np.asarray(fluorescence_data))
+    bounds = np.asarray(time_windows, dtype=float).reshape(-1, 2)
+    start_idx = np.searchsorted(t_fluo, bounds[:, 0], side='left')
+    end_idx = np.searchsorted(t_fluo, bounds[:, 1], side='left')
+    lengths = end_idx - start_idx
+    kept = np.flatnonzero(lengths > 0)
+    if kept.size == 0:
+        return np.empty((data.shape[0], 0, 0), dtype=data.dtype), kept
+    min_len = lengths[kept].min()
+    sample_idx = start_idx[kept, None] + np.arange(min_len)
+    return data[:, sample_idx], kept
+
+
+def analyze_pair(pressure_file, fluorescence_file, pressure_freq=800.0, fluo_freq=40.0,
+                 filter_hz=1.0, peak_height=2, chunk_size=None, workdir=None,
+                 baseline_window=None, approx_baseline=False):
+    """
+    处理一对压力/荧光文件，返回包含全部中间结果的字典。
+
+    指定 baseline_window（秒）时先对荧光数据做滑动中值基线校正，'raw_fluorescence'
+    保留未校正的荧光（ΔF/F 需要以原始荧光为分母）；未校正时两者为同一数组。
+
+    指定 chunk_size 时压力数据以内存映射方式读取，并用 stream_filter 分块做零相位
+    滤波与二阶差分（结果为 workdir 中的内存映射数组），此时 't_pressure' 与
+    'time_diff2' 为 None。
+    """
+    raw_fluorescence, t_fluo = load_fluorescence(fluorescence_file, fluo_freq)
+    fluorescence_data = raw_fluorescence
+    if baseline_window:
+        fluorescence_data = correct_fluorescence_baseline(raw_fluorescence, fluo_freq, baseline_window,
+                                                          approx=approx_baseline)
+    if chunk_size:
+        electrical_stim, pressure_coef, t_pressure = load_pressure(pressure_file, pressure_freq, mmap=True)
+        filteredPressure, pressureDiff2 = stream_filter.pressure_second_difference_chunked(
+            pressure_coef, pressure_freq, filter_hz=filter_hz, chunk_size=chunk_size, workdir=workdir)
+        peaks = stream_filter.find_peaks_chunked(pressureDiff2, peak_height, scale=1e6, chunk_size=chunk_size)
+        time_diff2 = None
+        time_peaks = peaks / pressure_freq
+    else:
+        electrical_stim, pressure_coef, t_pressure = load_pressure(pressure_file, pressure_freq)
+        filteredPressure, pressureDiff2, time_diff2 = pressure_second_difference(
+            pressure_coef, pressure_freq, filter_hz=filter_hz)
+        peaks, time_peaks = detect_diff2_peaks(pressureDiff2, time_diff2, height=peak_height)
+    return {
+        'electrical_stim': electrical_stim,
+        'pressure_coef': pressure_coef,
+        't_pressure': t_pressure,
+        'fluorescence_data': fluorescence_data,
+        'raw_fluorescence': raw_fluorescence,
+        't_fluo': t_fluo,
+        'filtered_pressure': filteredPressure,
+        'pressure_diff2': pressureDiff2,
+        'time_diff2': time_diff2,
+        'peaks': peaks,
+        'time_peaks': time_peaks,
+    }
+
+
+def session_metadata(pressure_file, fluorescence_file, pressure_freq, fluo_freq, time_windows,
+                     filter_hz=1.0, peak_height=2, **settings):
+    """整理写入分段文件的会话信息；settings 为其他处理参数（时间窗长度、不应期等）。"""
+    metadata = {
+        'pressure_file': os.path.abspath(pressure_file),
+        'fluorescence_file': os.path.abspath(fluorescence_file),
+        'pressure_freq': float(pressure_freq),
+        'fluo_freq': float(fluo_freq),
+        'filter_hz': float(filter_hz),
+        'filter_order': 3,
+        'peak_height': peak_height,
+        'time_windows': [[float(start), float(end)] for start, end in time_windows],
+    }
+    metadata.update(settings)
+    return metadata
+
+
+def file_sha1(file_path):
+    """文件内容的 SHA-1；同一进程内按路径、修改时间和大小缓存，避免重复读取大文件。"""
+    st = os.stat(file_path)
+    key = (os.path.abspath(file_path), st.st_mtime_ns, st.st_size)
+    if key not in _sha1_cache:
+        digest = hashlib.sha1()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+                digest.update(chunk)
+        _sha1_cache[key] = digest.hexdigest()
+    return _sha1_cache[key]
+
+
+def session_path(fluorescence_file):
+    return os.path.splitext(fluorescence_file)[0] + SESSION_SUFFIX
+
+
+def save_session(pressure_file, fluorescence_file, pressure_freq, fluo_freq, time_windows, path=None,
+                 **settings):
+    """
+    把时间窗与处理参数写入会话文件（默认为荧光文件旁的 .session.json），
+    同时记录两个数据文件的 SHA-1，返回会话文件路径。
+    """
+    session = session_metadata(pressure_file, fluorescence_file, pressure_freq, fluo_freq, time_windows,
+                               **settings)
+    session['pressure_sha1'] = file_sha1(pressure_file)
+    session['fluorescence_sha1'] = file_sha1(fluorescence_file)
+    if path is None:
+        path = session_path(fluorescence_file)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(session, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_session(pressure_file, fluorescence_file, path=None):
+    """
+    读取这对文件的会话文件；会话文件不存在、无法解析或数据文件内容已改变
+    （SHA-1 不一致）时返回 None。
+    """
+    if path is None:
+        path = session_path(fluorescence_file)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            session = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if (session.get('pressure_sha1') != file_sha1(pressure_file)
+            or session.get('fluorescence_sha1') != file_sha1(fluorescence_file)):
+        return None
+    session['time_windows'] = [tuple(window) for window in session.get('time_windows', [])]
+    return session
+
+
+def _metadata_json(metadata):
+    return json.dumps(metadata or {}, ensure_ascii=False,
+                      default=lambda o: o.tolist() if hasattr(o, 'tolist') else str(o))
+
+
+def _write_segments_parquet(file_path, segments, metadata):
+    if pq is None:
+        raise ImportError("写出 Parquet 需要安装 pyarrow")
+    n_neurons, n_windows, n_samples = segments.shape
+    per_neuron = n_windows * n_samples
+    # 长表：每行一个采样点，按 (神经元, 时间窗, 采样点) 排序，便于按神经元过滤读取
+    table = pa.table({
+        'neuron': np.repeat(np.arange(1, n_neurons + 1, dtype=np.int32), per_neuron),
+        'window': np.tile(np.repeat(np.arange(1, n_windows + 1, dtype=np.int32), n_samples), n_neurons),
+        'sample': np.tile(np.arange(n_samples, dtype=np.int32), n_neurons * n_windows),
+        'value': np.ascontiguousarray(segments).reshape(-1),
+    })
+    table = table.replace_schema_metadata({b'session': _metadata_json(metadata).encode('utf-8')})
+    row_group = per_neuron * max(PARQUET_ROW_GROUP // per_neuron, 1)
+    pq.write_table(table, file_path, compression='zstd', row_group_size=row_group)
+
+
+def _write_segments_h5(file_path, segments, metadata):
+    if h5py is None:
+        raise ImportError("写出 HDF5 需要安装 h5py")
+    with h5py.File(file_path, 'w') as f:
+        # 每个神经元一个数据块，可只读取部分神经元
+        f.create_dataset('segments', data=segments, compression='gzip', shuffle=True,
+                         chunks=(1,) + segments.shape[1:])
+        f.attrs['metadata'] = _metadata_json(metadata)
+
+
+def write_segments(file_path, segments, summary=None, metadata=None):
+    """
+    将 extract_windows 得到的 (神经元, 时间窗, 采样点) 数组写入文件，格式由后缀决定：
+    - .xlsx 每个神经元一个工作表（每列一个时间窗）
+    - .npz 压缩的 segments 数组
+    - .parquet 列为 neuron、window、sample、value 的长表（需要 pyarrow）
+    - .h5 按神经元分块压缩的 segments 数据集（需要 h5py）
+    - 其他后缀写为文本
+
+    metadata 为会话信息字典（采样率、时间窗、滤波参数等），以 JSON 保存在
+    .npz/.parquet/.h5 中，可由 read_segments 读回。
+
+    summary 为 event_average.event_triggered_average 的结果时一并写出汇总：
+    .xlsx 增加 Summary（指标长表）与 Mean_SEM（平均曲线）工作表，其他格式写为
+    同名的 _summary.csv 与 _mean_sem.csv。
+    """
+    n_neurons, n_windows, _ = segments.shape
+    if n_windows == 0:
+        return
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext == '.xlsx':
+        columns = [f'window_{j + 1}' for j in range(n_windows)]
+        with pd.ExcelWriter(file_path) as writer:
+            if summary is not None:
+                summary['table'].to_excel(writer, sheet_name='Summary', index=False)
+                event_average.trace_frame(summary).to_excel(writer, sheet_name='Mean_SEM', index=False)
+            for i in range(n_neurons):
+                df = pd.DataFrame(segments[i].T, columns=columns)
+                df.to_excel(writer, sheet_name=f'Neuron_{i + 1}', index=False)
+        return
+    if ext == '.npz':
+        np.savez_compressed(file_path, segments=segments, metadata=np.array(_metadata_json(metadata)))
+    elif ext == '.parquet':
+        _write_segments_parquet(file_path, segments, metadata)
+    elif ext == '.h5':
+        _write_segments_h5(file_path, segments, metadata)
+    else:
+        with open(file_path, 'w') as f:
+            for i in range(n_neurons):
+                f.write(f'Neuron {i + 1}\n')
+                for j in range(n_windows):
+                    f.write(f'Window {j + 1}:\n')
+                    np.savetxt(f, segments[i, j], fmt='%f')
+                f.write('\n')
+    if summary is not None:
+        root = os.path.splitext(file_path)[0]
+        summary['table'].to_csv(f'{root}_summary.csv', index=False)
+        event_average.trace_frame(summary).to_csv(f'{root}_mean_sem.csv', index=False)
+
+
+def read_segments(file_path, neurons=None):
+    """
+    读取 write_segments 写出的 .npz/.parquet/.h5 文件，返回 (segments, metadata)。
+
+    neurons 为 0 起始的神经元索引时只返回这些神经元（按索引升序）；.parquet 与 .h5
+    只从磁盘读取所需部分。
+    """
+    selected = None if neurons is None else sorted(set(int(i) for i in neurons))
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext == '.npz':
+        with np.load(file_path, allow_pickle=False) as f:
+            segments = f['segments']
+            metadata = json.loads(str(f['metadata']))
+        if selected is not None:
+            segments = segments[selected]
+    elif ext == '.parquet':
+        if pq is None:
+            raise ImportError("读取 Parquet 需要安装 pyarrow")
+        filters = None if selected is None else [('neuron', 'in', [i + 1 for i in selected])]
+        table = pq.read_table(file_path, filters=filters)
+        schema_metadata = pq.read_schema(file_path).metadata or {}
+        metadata = json.loads(schema_metadata.get(b'session', b'{}').decode('utf-8'))
+        values = table['value'].to_numpy()
+        if table.num_rows:
+            n_windows = int(table['window'].to_numpy().max())
+            n_samples = int(table['sample'].to_numpy().max()) + 1
+            segments = values.reshape(-1, n_windows, n_samples)
+        else:
+            segments = values.reshape(0, 0, 0)
+    elif ext == '.h5':
+        if h5py is None:
+            raise ImportError("读取 HDF5 需要安装 h5py")
+        with h5py.File(file_path, 'r') as f:
+            dataset = f['segments']
+            segments = dataset[...] if selected is None else dataset[selected]
+            metadata = json.loads(f.attrs['metadata'])
+    else:
+        raise ValueError(f"不支持的分段文件格式: {file_path}")
+    return segments, metadata
@@ -1,34 +1,296 @@
-import os, shutil, random
-random.seed(0)
+"""
+把 YOLO 数据集划分为 train/val/test。
+
+默认按类别分层、按组划分：先一次性解析全部标签文件得到每个文件的类别直方图，
+同一组（如同一视野、同一动物的裁剪图，由 --group_regex 或 --groups 指定）的文件
+整体分到同一子集，各子集中每个类别的目标数量尽量接近设定比例。--strategy random
+为原来的随机打乱切分。
+
+划分结果以以下方式之一放到 images/{train,val,test} 与 labels/{train,val,test}：
+- hardlink: 硬链接，不占额外空间；跨文件系统等无法链接时退回复制
+- symlink: 指向源文件绝对路径的符号链接；无法创建时退回复制
+- copy: 复制文件
+- list: 不放置文件，只写出 train.txt/val.txt/test.txt 图像路径列表（YOLO 按路径中的
+  images -> labels 查找标签，因此要求源目录符合该结构）
+文件在线程池中并行放置，同时写出记录每个文件所属子集的清单 CSV。
+
+示例:
+    python split_data.py --mode hardlink --clean --workers 16
+"""
+import argparse
+import csv
+import io
+import os
+import random
+import re
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
-from sklearn.model_selection import train_test_split
-
-val_size = 0.1
-test_size = 0.2
-postfix = 'jpg'
-imgpath = 'VOCdevkit/JPEGImages'
-txtpath = 'VOCdevkit/txt'
-
-os.makedirs('images/train', exist_ok=True)
-os.makedirs('images/val', exist_ok=True)
-os.makedirs('images/test', exist_ok=True)
-os.makedirs('labels/train', exist_ok=True)
-os.makedirs('labels/val', exist_ok=True)
-os.makedirs('labels/test', exist_ok=True)
-
-listdir = np.array([i for i in os.listdir(txtpath) if 'txt' in i])
-random.shuffle(listdir)
-train, val, test = listdir[:int(len(listdir) * (1 - val_size - test_size))], listdir[int(len(listdir) * (1 - val_size - test_size)):int(len(listdir) * (1 - test_size))], listdir[int(len(listdir) * (1 - test_size)):]
-print(f'train set size:{len(train)} val set size:{len(val)} test set size:{len(test)}')
-
-for i in train:
-    shutil.copy('{}/{}.{}'.format(imgpath, i[:-4], postfix), 'images/train/{}.{}'.format(i[:-4], postfix))
-    shutil.copy('{}/{}'.format(txtpath, i), 'labels/train/{}'.format(i))
-
-for i in val:
-    shutil.copy('{}/{}.{}'.format(imgpath, i[:-4], postfix), 'images/val/{}.{}'.format(i[:-4], postfix))
-    shutil.copy('{}/{}'.format(txtpath, i), 'labels/val/{}'.format(i))
-
-for i in test:
-    shutil.copy('{}/{}.{}'.format(imgpath, i[:-4], postfix), 'images/test/{}.{}'.format(i[:-4], postfix))
-    shutil.copy('{}/{}'.format(txtpath, i), 'labels/test/{}'.format(i))
\ No newline at end of file
+import pandas as pd
+
+SUBSETS = ('train', 'val', 'test')
+SPLIT_MODES = ('hardlink', 'symlink', 'copy', 'list')
+SPLIT_STRATEGIES = ('stratified', 'random')
+MANIFEST_FIELDS = ['name', 'group', 'subset', 'image', 'label', 'mode']
+
+
+def _read_lines(path):
+    """读取标签文件中的非空行（去掉首尾空白），空文件或只有空行时返回空列表。"""
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        return [line for line in (raw.strip() for raw in f) if line]
+
+
+def _class_id(line):
+    """行首的类别编号，不是非负整数时返回 None。"""
+    try:
+        value = float(line.split()[0])
+    except ValueError:
+        return None
+    return int(value) if value >= 0 and value == int(value) else None
+
+
+def build_label_index(txtpath, names, workers=8):
+    """
+    解析所有标签文件每行第一列的类别编号，返回 (文件数, 类别数) 的目标计数矩阵。
+
+    文件在线程池中读取并去掉空行后拼接，由 pandas 的 C 解析器一次解析；类别不是
+    非负整数的行不计入。拼接解析的行数与文件行数对不上时改为逐个文件解析。
+    """
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        file_lines = list(executor.map(_read_lines, [os.path.join(txtpath, name) for name in names]))
+    line_counts = np.array([len(lines) for lines in file_lines], dtype=np.int64)
+    if line_counts.sum() == 0:
+        return np.zeros((len(names), 0), dtype=np.int64)
+    file_idx = np.repeat(np.arange(len(names)), line_counts)
+    text = '\n'.join(line for lines in file_lines for line in lines)
+    try:
+        column = pd.read_csv(io.StringIO(text), sep=r'\s+', header=None, usecols=[0], engine='c',
+                             quoting=csv.QUOTE_NONE, low_memory=False).iloc[:, 0]
+        cls = pd.to_numeric(column, errors='coerce').to_numpy(dtype=np.float64)
+    except (ValueError, pd.errors.ParserError):
+        cls = None
+    if cls is None or len(cls) != len(file_idx):
+        cls = np.array([np.nan if c is None else c
+                        for lines in file_lines for c in map(_class_id, lines)], dtype=np.float64)
+    valid = ~np.isnan(cls) & (cls >= 0) & (cls == np.floor(cls))
+    cls = cls[valid].astype(np.int64)
+    file_idx = file_idx[valid]
+    n_classes = int(cls.max()) + 1 if cls.size else 0
+    counts = np.bincount(file_idx * n_classes + cls, minlength=len(names) * n_classes)
+    return counts.reshape(len(names), n_classes)
+
+
+def group_keys(names, group_regex=None, group_file=None):
+    """
+    返回每个标签文件所属的组。
+
+    group_file 为列 name、group 的 CSV（name 为不含后缀的文件名），优先使用；
+    否则对文件名（不含后缀）做 group_regex 搜索，取第一个捕获组（没有捕获组时取
+    整个匹配）。都未指定或未匹配时每个文件自成一组。
+    """
+    stems = [os.path.splitext(name)[0] for name in names]
+    mapping = {}
+    if group_file:
+        with open(group_file, 'r', encoding='utf-8-sig', newline='') as f:
+            mapping = {row['name'].strip(): row['group'].strip() for row in csv.DictReader(f)}
+    pattern = re.compile(group_regex) if group_regex else None
+    groups = []
+    for stem in stems:
+        if stem in mapping:
+            groups.append(mapping[stem])
+            continue
+        match = pattern.search(stem) if pattern is not None else None
+        if match is None:
+            groups.append(stem)
+        else:
+            groups.append(match.group(1) if pattern.groups else match.group(0))
+    return np.array(groups)
+
+
+def stratified_group_split(counts, groups, fractions, seed=0):
+    """
+    按组的迭代分层划分，返回每个文件所属子集的索引（对应 fractions 的顺序）。
+
+    每个子集对每个类别的目标数量为 总数 × 比例。组按其包含的最稀有类别的总数
+    从少到多、同一稀有度内按文件数从多到少（再按随机顺序）依次分配：分到该稀有
+    类别缺口最大的子集，缺口相同时分到文件数缺口最大的子集；不含目标的组按文件
+    数缺口分配。
+    """
+    fractions = np.asarray(fractions, dtype=np.float64)
+    unique_groups, group_idx = np.unique(groups, return_inverse=True)
+    n_groups = len(unique_groups)
+    n_classes = counts.shape[1]
+    group_counts = np.zeros((n_groups, n_classes), dtype=np.int64)
+    np.add.at(group_counts, group_idx, counts)
+    group_sizes = np.bincount(group_idx, minlength=n_groups)
+
+    class_totals = group_counts.sum(axis=0)
+    need = fractions[:, None] * class_totals[None, :]
+    file_need = fractions * len(groups)
+
+    # 每个组中最稀有的类别；没有目标的组排在最后
+    present = group_counts > 0
+    has_label = present.any(axis=1)
+    rarest = np.zeros(n_groups, dtype=np.int64)
+    rarest_total = np.full(n_groups, np.iinfo(np.int64).max)
+    if n_classes:
+        rarest = np.argmin(np.where(present, class_totals[None, :], np.iinfo(np.int64).max), axis=1)
+        rarest_total = np.where(has_label, class_totals[rarest], rarest_total)
+    order = np.lexsort((np.random.default_rng(seed).permutation(n_groups), -group_sizes, rarest_total))
+
+    active = np.flatnonzero(fractions > 0)  # 比例为 0 的子集不分配
+    assignment = np.empty(n_groups, dtype=np.int64)
+    for g in order:
+        candidates = active
+        if has_label[g]:
+            label_need = need[active, rarest[g]]
+            candidates = active[label_need == label_need.max()]
+        subset = candidates[np.argmax(file_need[candidates])]
+        assignment[g] = subset
+        need[subset] -= group_counts[g]
+        file_need[subset] -= group_sizes[g]
+    return assignment[group_idx]
+
+
+def random_split(listdir, val_size, test_size, seed=0):
+    """打乱后按比例切分，返回 {子集: 文件名数组}。"""
+    listdir = np.array(listdir)
+    random.seed(seed)
+    random.shuffle(listdir)
+    n_train = int(len(listdir) * (1 - val_size - test_size))
+    n_train_val = int(len(listdir) * (1 - test_size))
+    return {'train': listdir[:n_train], 'val': listdir[n_train:n_train_val], 'test': listdir[n_train_val:]}
+
+
+def place_file(src, dst, mode):
+    """
+    按 mode 把 src 放到 dst（已存在的 dst 先删除），返回实际使用的方式。
+
+    硬链接或符号链接失败（跨文件系统、权限不足等）时退回复制。
+    """
+    if os.path.lexists(dst):
+        os.remove(dst)
+    try:
+        if mode == 'hardlink':
+            os.link(src, dst)
+            return mode
+        if mode == 'symlink':
+            os.symlink(os.path.abspath(src), dst)
+            return mode
+    except OSError:
+        pass
+    shutil.copy(src, dst)
+    return 'copy'
+
+
+def clean_dir(directory):
+    """删除目录中上一次划分留下的文件与链接。"""
+    for entry in os.scandir(directory):
+        if entry.is_file(follow_symlinks=False) or entry.is_symlink():
+            os.remove(entry.path)
+
+
+def write_list(path, image_files):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(image_files))
+        if image_files:
+            f.write('\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='划分 YOLO 数据集为 train/val/test')
+    parser.add_argument('--imgpath', default='VOCdevkit/JPEGImages', type=str, help='图像目录')
+    parser.add_argument('--txtpath', default='VOCdevkit/txt', type=str, help='标签 txt 目录')
+    parser.add_argument('--postfix', default='jpg', type=str, help='图像后缀')
+    parser.add_argument('--val_size', default=0.1, type=float, help='验证集比例')
+    parser.add_argument('--test_size', default=0.2, type=float, help='测试集比例')
+    parser.add_argument('--seed', default=0, type=int, help='随机种子')
+    parser.add_argument('--strategy', default='stratified', choices=SPLIT_STRATEGIES,
+                        help='stratified: 按组、按类别分层；random: 随机打乱切分')
+    parser.add_argument('--group_regex', default=None, type=str,
+                        help=r'从文件名提取组的正则（取第一个捕获组），如 "^(.+)_crop\d+$"')
+    parser.add_argument('--groups', default=None, type=str, help='组对照 CSV（列: name, group），优先于 --group_regex')
+    parser.add_argument('--output', default='.', type=str, help='输出根目录（images/、labels/、列表与清单）')
+    parser.add_argument('--mode', default='hardlink', choices=SPLIT_MODES, help='文件放置方式')
+    parser.add_argument('--clean', action='store_true', help='放置前清空输出子目录中上一次划分的文件')
+    parser.add_argument('--manifest', default='split_manifest.csv', type=str, help='清单 CSV 文件名（位于输出根目录）')
+    parser.add_argument('--workers', default=8, type=int, help='放置文件的线程数')
+    arg = parser.parse_args()
+
+    listdir = sorted(i for i in os.listdir(arg.txtpath) if i.endswith('.txt'))
+    groups = group_keys(listdir, arg.group_regex, arg.groups)
+    group_of = dict(zip(listdir, groups))
+    if arg.strategy == 'random':
+        splits = random_split(listdir, arg.val_size, arg.test_size, arg.seed)
+    else:
+        counts = build_label_index(arg.txtpath, listdir, arg.workers)
+        fractions = [1 - arg.val_size - arg.test_size, arg.val_size, arg.test_size]
+        subset_idx = stratified_group_split(counts, groups, fractions, arg.seed)
+        listdir = np.array(listdir)
+        splits = {subset: listdir[subset_idx == k] for k, subset in enumerate(SUBSETS)}
+        print(f'{len(listdir)} 个标签文件，{len(np.unique(groups))} 个组，各子集每类目标数:')
+        print(pd.DataFrame([counts[subset_idx == k].sum(axis=0) for k in range(len(SUBSETS))],
+                           index=list(SUBSETS)).to_string())
+    print(f"train set size:{len(splits['train'])} val set size:{len(splits['val'])} test set size:{len(splits['test'])}")
+
+    start_time = time.time()
+    os.makedirs(arg.output, exist_ok=True)
+    rows = []
+    jobs = []
+    for subset in SUBSETS:
+        image_dir = os.path.join(arg.output, 'images', subset)
+        label_dir = os.path.join(arg.output, 'labels', subset)
+        if arg.mode != 'list':
+            for directory in (image_dir, label_dir):
+                os.makedirs(directory, exist_ok=True)
+                if arg.clean:
+                    clean_dir(directory)
+        image_files = []
+        for i in splits[subset]:
+            image_src = os.path.join(arg.imgpath, f'{i[:-4]}.{arg.postfix}')
+            label_src = os.path.join(arg.txtpath, i)
+            if arg.mode == 'list':
+                image, label = os.path.abspath(image_src), os.path.abspath(label_src)
+                image_files.append(image)
+            else:
+                image = os.path.join(image_dir, f'{i[:-4]}.{arg.postfix}')
+                label = os.path.join(label_dir, i)
+                jobs.append((len(rows), image_src, image))
+                jobs.append((len(rows), label_src, label))
+            rows.append({'name': i[:-4], 'group': group_of[i], 'subset': subset, 'image': image, 'label': label, 'mode': arg.mode})
+        if arg.mode == 'list':
+            write_list(os.path.join(arg.output, f'{subset}.txt'), image_files)
+
+    error_file_list = []
+    if jobs:
+        def run(job):
+            row_index, src, dst = job
+            try:
+                return row_index, place_file(src, dst, arg.mode), ''
+            except OSError as e:
+                return row_index, '', str(e)
+
+        with ThreadPoolExecutor(max_workers=arg.workers) as executor:
+            for row_index, used_mode, error in executor.map(run, jobs):
+                row = rows[row_index]
+                if error:
+                    row['mode'] = 'error'
+                    error_file_list.append(f"{row['name']}: {error}")
+                elif used_mode != arg.mode and row['mode'] != 'error':
+                    row['mode'] = used_mode
+
+    with open(os.path.join(arg.output, arg.manifest), 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=MANIFEST_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    n_fallback = sum(row['mode'] == 'copy' for row in rows) if arg.mode in ('hardlink', 'symlink') else 0
+    print(f'放置方式 {arg.mode}，用时 {time.time() - start_time:.1f} 秒'
+          + (f'，其中 {n_fallback} 个文件退回复制' if n_fallback else ''))
+    if error_file_list:
+        print(f'处理失败的文件:\n{error_file_list}')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+分块的零相位滤波与二阶差分，用于超长压力记录。
+
+输入可以是内存映射数组，按块读取；滤波结果与二阶差分写入临时目录中的
+.npy 内存映射文件，内存占用只与块大小有关。
+
+零相位滤波采用与 scipy.signal.sosfiltfilt 相同的做法（两端奇延拓 +
+正向/反向滤波），块之间通过传递二阶节滤波器状态衔接，因此分块结果与
+对整段数据调用 sosfiltfilt 一致。
+"""
+import os
+import tempfile
+
+import numpy as np
+from scipy.signal import butter, find_peaks, sosfilt, sosfilt_zi
+
+DEFAULT_CHUNK_SIZE = 1 << 20  # 每块采样点数
+
+
+def _default_padlen(sos):
+    # 与 sosfiltfilt 的默认延拓长度相同
+    ntaps = 2 * len(sos) + 1 - min((sos[:, 2] == 0).sum(), (sos[:, 5] == 0).sum())
+    return 3 * ntaps
+
+
+def _open_output(workdir, name, length):
+    path = os.path.join(workdir, name)
+    return np.lib.format.open_memmap(path, mode='w+', dtype=np.float64, shape=(length,))
+
+
+def sosfiltfilt_chunked(x, sos, out, chunk_size=DEFAULT_CHUNK_SIZE, padlen=None):
+    """
+    对一维数组 x 做零相位二阶节滤波，结果写入与 x 等长的 out。
+
+    x 与 out 都可以是内存映射数组；每次只读入 chunk_size 个采样点。
+    """
+    n = len(x)
+    if padlen is None:
+        padlen = _default_padlen(sos)
+    if n <= padlen:
+        raise ValueError(f"数据长度 {n} 必须大于延拓长度 {padlen}")
+    zi = sosfilt_zi(sos)
+
+    # 正向滤波：起点奇延拓 -> 各数据块 -> 终点奇延拓，状态在块之间传递
+    x0 = float(x[0])
+    head = 2 * x0 - np.asarray(x[1:padlen + 1], dtype=np.float64)[::-1]
+    _, z = sosfilt(sos, head, zi=zi * head[0])
+    for start in range(0, n, chunk_size):
+        stop = min(start + chunk_size, n)
+        out[start:stop], z = sosfilt(sos, np.asarray(x[start:stop], dtype=np.float64), zi=z)
+    xn = float(x[n - 1])
+    tail = 2 * xn - np.asarray(x[n - padlen - 1:n - 1], dtype=np.float64)[::-1]
+    tail_filtered, _ = sosfilt(sos, tail, zi=z)
+
+    # 反向滤波：从终点延拓段开始，按块倒序处理并覆盖 out
+    _, z = sosfilt(sos, tail_filtered[::-1], zi=zi * tail_filtered[-1])
+    for stop in range(n, 0, -chunk_size):
+        start = max(stop - chunk_size, 0)
+        y, z = sosfilt(sos, np.asarray(out[start:stop])[::-1], zi=z)
+        out[start:stop] = y[::-1]
+    return out
+
+
+def second_difference_chunked(y, out, chunk_size=DEFAULT_CHUNK_SIZE):
+    """按块计算 np.diff(y, n=2)，结果写入长度为 len(y) - 2 的 out。"""
+    n_out = len(y) - 2
+    for start in range(0, n_out, chunk_size):
+        stop = min(start + chunk_size, n_out)
+        seg = np.asarray(y[start:stop + 2], dtype=np.float64)
+        out[start:stop] = seg[2:] - 2 * seg[1:-1] + seg[:-2]
+    return out
+
+
+def find_peaks_chunked(x, height, scale=1.0, chunk_size=DEFAULT_CHUNK_SIZE, overlap=1024):
+    """
+    按块在 x * scale 上检测峰值，返回全局索引。
+
+    相邻块重叠 overlap 个采样点，只保留落在本块内的峰，避免块边界处漏检。
+    """
+    n = len(x)
+    peaks = []
+    for start in range(0, n, chunk_size):
+        stop = min(start + chunk_size, n)
+        lo = max(start - overlap, 0)
+        hi = min(stop + overlap, n)
+        local, _ = find_peaks(np.asarray(x[lo:hi], dtype=np.float64) * scale, height=height)
+        local = local + lo
+        peaks.append(local[(local >= start) & (local < stop)])
+    return np.concatenate(peaks) if peaks else np.empty(0, dtype=np.intp)
+
+
+def pressure_second_difference_chunked(pressure_coef, pressure_freq, filter_hz=1.0, order=3,
+                                       chunk_size=DEFAULT_CHUNK_SIZE, workdir=None):
+    """
+    pc_core.pressure_second_difference 的分块版本。
+
+    使用二阶节形式的 Butterworth 低通滤波器，返回 (滤波压力, 二阶差分)，
+    二者为 workdir（默认新建临时目录）中的 .npy 内存映射数组。
+    """
+    if workdir is None:
+        workdir = tempfile.mkdtemp(prefix='pressure_')
+    sos = butter(order, filter_hz / (pressure_freq / 2), btype='low', output='sos')
+    n = len(pressure_coef)
+    filtered = _open_output(workdir, 'filtered_pressure.npy', n)
+    sosfiltfilt_chunked(pressure_coef, sos, filtered, chunk_size=chunk_size)
+    diff2 = _open_output(workdir, 'pressure_diff2.npy', n - 2)
+    second_difference_chunked(filtered, diff2, chunk_size=chunk_size)
+    filtered.flush()
+    diff2.flush()
+    return filtered, diff2
@@ -4,6 +4,8 @@ import glob
 import random
 import numpy as np
 
+import imgsize
+
 # 设置超分辨率结果目录 & 2x GT 目录
 sr_folder = "/public/xu/deeplearning/ultralytics-yolo11-main/dataset/Neuron_x2/val/images"  # 超分辨率图像路径
 gt_x2_folder = "/public/xu/deeplearning/ultralytics-yolo11-main/dataset/Neuron_x2/val/masks"  # 放大后的 GT 路径
@@ -23,19 +25,22 @@ gt_x2_dict = {os.path.basename(f): f for f in gt_x2_images}
 # 记录尺寸不匹配的图像
 mismatch_files = []
 
+# 尺寸检查只读取文件头，结果缓存在各目录的索引中
+sr_sizes = imgsize.directory_sizes(sr_folder, list(sr_dict.keys()))
+gt_x2_sizes = imgsize.directory_sizes(gt_x2_folder, list(gt_x2_dict.keys()))
+
 # 遍历 SR 目录，检查尺寸
 for filename in sr_dict.keys():
     if filename not in gt_x2_dict:
         print(f"Warning: {filename} 在 GT_x2 目录中不存在！")
         continue
 
-    # 读取图像
-    img_sr = cv2.imread(sr_dict[filename])
-    img_gt_x2 = cv2.imread(gt_x2_dict[filename])
-
     # 获取尺寸
-    h_sr, w_sr, _ = img_sr.shape
-    h_gt, w_gt, _ = img_gt_x2.shape
+    if filename not in sr_sizes or filename not in gt_x2_sizes:
+        print(f"Warning: {filename} 无法读取！")
+        continue
+    w_sr, h_sr = sr_sizes[filename]
+    w_gt, h_gt = gt_x2_sizes[filename]
 
     # 检查尺寸是否匹配
     if (h_sr, w_sr) != (h_gt, w_gt):
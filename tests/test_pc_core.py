@@ -0,0 +1,41 @@
+import numpy as np
+
+import pc_core
+
+
+def _write(tmp_path, text, name='data.txt'):
+    path = tmp_path / name
+    path.write_text(text, encoding='utf-8')
+    return str(path)
+
+
+def test_mixed_whitespace_without_header(tmp_path):
+    path = _write(tmp_path, '1  2 3\n4\t5 6\n')
+    assert pc_core.sniff_text_format(path) == (None, False)
+    data = pc_core.load_matrix(path, dtype=np.float64, use_cache=False)
+    np.testing.assert_array_equal(data, [[1, 2, 3], [4, 5, 6]])
+
+
+def test_tab_delimiter_without_header(tmp_path):
+    path = _write(tmp_path, '1\t2\t3\n4\t5\t6\n')
+    assert pc_core.sniff_text_format(path) == ('\t', False)
+    data = pc_core.load_matrix(path, dtype=np.float64, use_cache=False)
+    np.testing.assert_array_equal(data, [[1, 2, 3], [4, 5, 6]])
+
+
+def test_comma_delimiter_with_header(tmp_path):
+    path = _write(tmp_path, 'Time (s),Pressure\n0.0,1.5\n0.1,2.5\n')
+    assert pc_core.sniff_text_format(path) == (',', True)
+    data = pc_core.load_matrix(path, dtype=np.float64, use_cache=False)
+    np.testing.assert_array_equal(data, [[0.0, 1.5], [0.1, 2.5]])
+
+
+def test_inconsistent_delimiter_falls_back_to_whitespace(tmp_path):
+    path = _write(tmp_path, 'a b c\n1,5 2 3\n4 5 6\n')
+    assert pc_core.sniff_text_format(path) == (None, True)
+
+
+def test_truncated_last_sample_line_is_ignored(tmp_path, monkeypatch):
+    monkeypatch.setattr(pc_core, 'SNIFF_BYTES', 20)
+    path = _write(tmp_path, '1,2,3\n4,5,6\n7,8,9\n10,11,12\n')
+    assert pc_core.sniff_text_format(path) == (',', False)
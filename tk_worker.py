@@ -0,0 +1,92 @@
+"""
+Tk 界面的后台计算。
+
+文件读取、滤波、峰值检测等耗时步骤放到线程池中执行，界面线程只负责绘图。
+后台任务不能直接操作 Tk 控件：进度通过队列传递，界面线程用 after() 定时
+取出进度并在任务完成后调用回调。新任务提交或调用 cancel() 时，旧任务的
+结果被丢弃，任务函数可在各步骤之间调用 check_cancelled() 提前结束。
+"""
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+POLL_MS = 50  # 界面线程检查后台任务状态的间隔（毫秒）
+
+
+class TaskCancelled(Exception):
+    """后台任务被取消。"""
+
+
+class BackgroundRunner:
+    """
+    在单线程的线程池中依次执行后台任务，同一时间只有最近提交的任务有效。
+
+    任务函数签名为 func(progress, cancel_event)：progress(message) 报告进度，
+    cancel_event 为 threading.Event，被设置时任务应尽快结束（可调用 check_cancelled）。
+    """
+
+    def __init__(self, root, poll_ms=POLL_MS):
+        self.root = root
+        self.poll_ms = poll_ms
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.future = None
+        self.cancel_event = None
+
+    @property
+    def busy(self):
+        return self.future is not None and not self.future.done()
+
+    def submit(self, func, on_done, on_error=None, on_progress=None):
+        """
+        提交任务。on_done(result)、on_error(exception) 与 on_progress(message)
+        都在界面线程中调用；任务被取消或被新任务替代时不调用 on_done/on_error。
+        """
+        self.cancel()
+        cancel_event = threading.Event()
+        messages = queue.Queue()
+        future = self.executor.submit(func, messages.put, cancel_event)
+        self.future = future
+        self.cancel_event = cancel_event
+        self.root.after(self.poll_ms, self._poll, future, cancel_event, messages,
+                        on_done, on_error, on_progress)
+        return future
+
+    def _poll(self, future, cancel_event, messages, on_done, on_error, on_progress):
+        while True:
+            try:
+                message = messages.get_nowait()
+            except queue.Empty:
+                break
+            if on_progress is not None and not cancel_event.is_set():
+                on_progress(message)
+        if not future.done():
+            self.root.after(self.poll_ms, self._poll, future, cancel_event, messages,
+                            on_done, on_error, on_progress)
+            return
+        if future is self.future:
+            self.future = None
+        if cancel_event.is_set():
+            return
+        error = future.exception()
+        if error is None:
+            on_done(future.result())
+        elif not isinstance(error, TaskCancelled) and on_error is not None:
+            on_error(error)
+
+    def cancel(self):
+        """取消当前任务，返回是否有正在执行的任务。"""
+        running = self.busy
+        if self.cancel_event is not None:
+            self.cancel_event.set()
+        self.future = None
+        return running
+
+    def shutdown(self):
+        self.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def check_cancelled(cancel_event):
+    """任务函数在各步骤之间调用，已取消时抛出 TaskCancelled。"""
+    if cancel_event.is_set():
+        raise TaskCancelled()
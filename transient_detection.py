@@ -0,0 +1,773 @@
+"""
+钙瞬态事件检测（Signalprocessing.m 中 TransientDetection 的 Python 实现）。
+
+与 MATLAB 版本逐点滑动、每步做 polyfit/mean/std 不同，这里对一段起点
+一次性用滑动窗口视图计算基线线性拟合残差的标准差、预测窗口均值与最大
+上升速率，只在满足阈值的起点上执行起点/峰值/终点的逐点查找。检测到事件
+并替换信号后，只对受影响的起点重新计算。
+
+逐点查找部分无法向量化；安装 numba 时使用 JIT 编译的内核，否则使用
+NumPy 实现。detect_cell_loop 为与 MATLAB 逐行对应的直接循环实现，不与
+detect_cell 共用检测代码，用于校验与性能对比（--benchmark）。--compare 与目录中
+onset/peak/end.txt（ExportDetectedEvents 格式）的参考结果比较，不一致时返回非零
+退出码。fixtures/transient 中的参考结果由 detect_cell_loop 生成，尚未由 MATLAB
+导出，因此只校验 detect_cell 与直接循环实现一致，不代表与 MATLAB 一致。
+
+输出的 Onset/Peak/End 为 0 起始的采样点索引（MATLAB 结果减 1）。
+
+各神经元之间相互独立，workers > 1 时把神经元分片交给多个进程处理，
+数据矩阵通过共享内存传递，不需要为每个进程序列化整块数据。
+
+示例:
+    python transient_detection.py fixtures/transient/calcium.txt --compare fixtures/transient
+    python transient_detection.py calcium.txt --sampling_rate 20 --baseline_correction
+    python transient_detection.py rois.txt --workers 32
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+import baseline
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+DEFAULT_PARAMETERS = {
+    'SamplingRate': 20,  # 采样率（Hz）
+    'HighThreshold': 1,  # 高阈值系数
+    'LowThreshold': 0,  # 低阈值系数
+    'PredictionLength': 0.5,  # 预测窗口长度（秒）
+    'BaselineLength': 1,  # 用于基线估计的窗口长度（秒）
+    'LPfactor': 0.1,  # 平滑因子
+    'UseDetection': True,  # 启用事件检测
+}
+
+SCAN_BLOCK_MIN = 64  # 检测到事件后重新计算判断标准的起点数
+SCAN_BLOCK_MAX = 8192  # 连续未检测到事件时逐步增大到的最大起点数
+SHARDS_PER_WORKER = 4  # 每个进程平均分到的分片数，便于负载均衡
+
+# 工作进程中附加的共享内存及其数组视图
+_shared = None
+_shared_data = None
+
+
+def movmean(x, k):
+    """
+    与 MATLAB movmean(x, k) 相同的滑动平均（沿最后一维，端点处窗口收缩）。
+
+    k 为奇数时窗口以当前点为中心；为偶数时包含前 k/2 个点和后 k/2 - 1 个点。
+    """
+    x = np.asarray(x, dtype=np.float64)
+    k = max(int(k), 1)
+    n_before = k // 2
+    n_after = k - n_before - 1
+    n = x.shape[-1]
+    c = np.concatenate([np.zeros(x.shape[:-1] + (1,)), np.cumsum(x, axis=-1)], axis=-1)
+    idx = np.arange(n)
+    lo = np.maximum(idx - n_before, 0)
+    hi = np.minimum(idx + n_after + 1, n)
+    return (c[..., hi] - c[..., lo]) / (hi - lo)
+
+
+def window_lengths(parameters):
+    """由参数计算各窗口的采样点数，与 MATLAB 中的 floor 取整一致。"""
+    sr = parameters['SamplingRate']
+    return {
+        'PredictWindow': int(np.floor(parameters['PredictionLength'] * sr)),
+        'BaselineWindow': int(np.floor(parameters['BaselineLength'] * sr)),
+        'PeakAfterPoint': int(np.floor(0.1 * sr)),
+        'PeakPrePoint': int(np.floor(0.1 * sr)),
+        'EndWindow': int(np.floor(0.1 * sr)),
+        'PeakWindow': int(np.floor(0.1 * sr)),
+        'PeakPoint': int(np.floor(0.1 * sr)),
+        'DecayPoint': int(np.floor(0.5 * sr)),
+        'LPFvalue': int(np.floor(parameters['LPfactor'] * sr)),
+    }
+
+
+def scan_criteria(x, s0, s1, w, high, rate):
+    """
+    对起点 s0 <= s < s1（0 起始）批量计算判断标准。
+
+    基线窗口为 x[s:s+B]，预测窗口为 x[s+B:s+B+P]。返回字典：
+    'passed'（是否同时满足峰值与上升速率阈值）、'TestValue'、'MaxDifference'、
+    'BaselineSTD' 与 'MaxTestPoint'（预测窗口内最大值位置，0 起始）。
+    """
+    B = w['BaselineWindow']
+    P = w['PredictWindow']
+    pre = w['PeakPrePoint']
+    after = w['PeakAfterPoint']
+    n_s = s1 - s0
+    seg = np.asarray(x[s0:s1 + B + P - 1], dtype=np.float64)
+    # 判断标准对整体平移不变，减去均值以减小累加误差
+    seg = seg - seg.mean()
+
+    # 基线窗口：一次线性拟合的残差标准差（MATLAB std，N-1 归一化）
+    base = sliding_window_view(seg[:n_s + B - 1], B)
+    base_mean = base.mean(axis=1)
+    if B > 1:
+        t = np.arange(1, B + 1) - (B + 1) / 2
+        centered = base - base_mean[:, None]
+        sxy = centered @ t
+        ss_res = np.einsum('ij,ij->i', centered, centered) - sxy ** 2 / (t @ t)
+        baseline_std = np.sqrt(np.maximum(ss_res, 0) / (B - 1))
+    else:
+        baseline_std = np.zeros(n_s)
+
+    # 预测窗口：最大值附近的均值与最大一阶差分
+    test = sliding_window_view(seg[B:], P)[:n_s]
+    max_point = np.argmax(test, axis=1)
+    lo = np.maximum(max_point - pre, 0)
+    hi = np.minimum(max_point + after, P - 1)
+    csum = np.concatenate([np.zeros((n_s, 1)), np.cumsum(test, axis=1)], axis=1)
+    rows = np.arange(n_s)
+    test_value = (csum[rows, hi + 1] - csum[rows, lo]) / (hi - lo + 1) - base_mean
+    if P > 1:
+        max_difference = sliding_window_view(np.diff(seg[B:]), P - 1)[:n_s].max(axis=1)
+    else:
+        max_difference = np.full(n_s, np.nan)
+
+    passed = (test_value > high * baseline_std) & (max_difference > rate * baseline_std)
+    return {
+        'passed': passed,
+        'TestValue': test_value,
+        'MaxDifference': max_difference,
+        'BaselineSTD': baseline_std,
+        'MaxTestPoint': max_point,
+    }
+
+
+def _walk_event_numpy(x, xs, xs_csum, residual, s, max_test_point, baseline_std, w, high, rate):
+    """
+    从满足阈值的起点 s 出发，逐点查找起点、峰值与终点，并按 MATLAB 逻辑用残差替换事件段。
+
+    内部用 1 起始的下标书写以便与 MATLAB 代码逐行对应。返回
+    (是否记录, Onset, Peak, End, 下一个起点 s)，索引均为 1 起始，s 为 0 起始。
+    """
+    B = w['BaselineWindow']
+    P = w['PredictWindow']
+    PeakPoint = w['PeakPoint']
+    PeakWindow = w['PeakWindow']
+    EndWindow = w['EndWindow']
+    DecayPoint = w['DecayPoint']
+    L = len(x)
+    sample_index = s + 1
+    MaxPoint = max_test_point + 1
+
+    # 定位起始点
+    test_data = x[s + B:s + B + P]
+    data_combined = test_data - x[s:s + B].mean()
+    if P > 1:
+        data_diff = np.diff(data_combined)
+        fast_point_first = np.flatnonzero(data_diff > rate * baseline_std) + 1
+        if len(fast_point_first) == 0:
+            # 批量计算与逐点计算的舍入误差可能使阈值边界处无满足条件的点
+            fast_point_first = np.array([np.argmax(data_diff) + 1])
+        fast_point = fast_point_first[0]
+        for fp in range(len(fast_point_first) - 1):
+            a = fast_point_first[fp]
+            b = fast_point_first[fp + 1]
+            if data_combined[a] < data_combined[b] and b - a > 1 and data_combined[a + 1] < data_combined[a]:
+                fast_point = b
+                break
+        OnsetDetected = sample_index - 1 + B + fast_point
+    else:
+        OnsetDetected = sample_index - 1 + B
+
+    # 峰值：向后查找，直到后续 PeakPoint 个点的均值不再高于当前点
+    base = B + sample_index - 1 + MaxPoint
+    n = 1
+    if PeakPoint > 0 and base + n + PeakPoint <= L:
+        while x[base + n - 1:base + n + PeakPoint - 1].mean() - x[base + n - 2] > 0:
+            n += 1
+            if base + n + PeakPoint > L:
+                break
+    PeakDetected = base + n - 1
+
+    # 平滑信号上的峰值
+    MaxSmoothedPoint = int(np.argmax(xs[s + B:s + B + P])) + 1
+    base_s = B + sample_index - 1 + MaxSmoothedPoint
+    j = 1
+    if base_s + j + PeakWindow <= L:
+        while True:
+            k = base_s + j
+            rising = xs[k - 1] - xs[k - 2] > 0
+            ahead = (xs_csum[k + PeakWindow] - xs_csum[k - 1]) / (PeakWindow + 1) - xs[k - 1] > 0
+            if not (rising or ahead):
+                break
+            j += 1
+            if base_s + j + PeakWindow > L:
+                break
+    Peak_smoothed = base_s + j - 1
+
+    # 终点：平滑信号在 EndWindow 内仍高于阈值且持续下降时继续向后
+    p = 1
+    if EndWindow > 1 and Peak_smoothed + p + EndWindow <= L:
+        while True:
+            window = xs[Peak_smoothed + p:Peak_smoothed + EndWindow + p]
+            if not (window.max() > high * baseline_std and (window[-1] - window[0]) / (len(window) - 1) < 0):
+                break
+            p += 1
+            if Peak_smoothed + EndWindow + p > L:
+                break
+    EndDetected_smoothed = Peak_smoothed + p + 1
+    tail = x[EndDetected_smoothed:min(EndDetected_smoothed + EndWindow, L)]
+    if len(tail) > 0:
+        EndDetected = EndDetected_smoothed + int(np.argmin(tail)) + 1
+    else:
+        EndDetected = L
+    next_s = max(EndDetected - B, s + 1)
+
+    # 衰减段均值过低时不记录该事件
+    DecayValue = x[PeakDetected - 1:min(PeakDetected + DecayPoint, L)]
+    if DecayValue.mean() < rate * baseline_std:
+        return False, OnsetDetected, PeakDetected, EndDetected, next_s
+
+    # 用残差替换事件段，避免影响后续检测
+    end_value = x[EndDetected - 1]
+    if EndDetected - OnsetDetected + 1 >= B:
+        x[OnsetDetected - 1:EndDetected] = residual[OnsetDetected - 1:EndDetected] + end_value
+    else:
+        lo = max(EndDetected - B, 0)
+        x[lo:EndDetected] = residual[lo:EndDetected] + end_value
+    return True, OnsetDetected, PeakDetected, EndDetected, next_s
+
+
+def _walk_event_kernel(x, xs, xs_csum, residual, s, max_test_point, baseline_std,
+                       B, P, PeakPoint, PeakWindow, EndWindow, DecayPoint, high, rate):
+    """
+    _walk_event_numpy 的显式循环版本，只使用标量与连续 float64 数组，可由 numba 编译。
+
+    参数与返回值含义相同，窗口长度以标量传入。
+    """
+    L = x.shape[0]
+    sample_index = s + 1
+    MaxPoint = max_test_point + 1
+
+    # 定位起始点
+    base_mean = 0.0
+    for i in range(s, s + B):
+        base_mean += x[i]
+    base_mean /= B
+    t0 = s + B
+    if P > 1:
+        threshold = rate * baseline_std
+        fast_point = -1
+        prev = -1
+        best = 1
+        best_diff = -np.inf
+        for i in range(1, P):
+            d = (x[t0 + i] - base_mean) - (x[t0 + i - 1] - base_mean)
+            if d > best_diff:
+                best_diff = d
+                best = i
+            if not d > threshold:
+                continue
+            if prev < 0:
+                fast_point = i
+            elif (x[t0 + prev] - base_mean < x[t0 + i] - base_mean and i - prev > 1
+                  and x[t0 + prev + 1] - base_mean < x[t0 + prev] - base_mean):
+                fast_point = i
+                break
+            prev = i
+        if fast_point < 0:
+            fast_point = best
+        OnsetDetected = sample_index - 1 + B + fast_point
+    else:
+        OnsetDetected = sample_index - 1 + B
+
+    # 峰值
+    base = B + sample_index - 1 + MaxPoint
+    n = 1
+    if PeakPoint > 0 and base + n + PeakPoint <= L:
+        while True:
+            m = 0.0
+            for i in range(base + n - 1, base + n + PeakPoint - 1):
+                m += x[i]
+            if not m / PeakPoint - x[base + n - 2] > 0:
+                break
+            n += 1
+            if base + n + PeakPoint > L:
+                break
+    PeakDetected = base + n - 1
+
+    # 平滑信号上的峰值
+    MaxSmoothedPoint = 1
+    for i in range(1, P):
+        if xs[t0 + i] > xs[t0 + MaxSmoothedPoint - 1]:
+            MaxSmoothedPoint = i + 1
+    base_s = B + sample_index - 1 + MaxSmoothedPoint
+    j = 1
+    if base_s + j + PeakWindow <= L:
+        while True:
+            k = base_s + j
+            rising = xs[k - 1] - xs[k - 2] > 0
+            ahead = (xs_csum[k + PeakWindow] - xs_csum[k - 1]) / (PeakWindow + 1) - xs[k - 1] > 0
+            if not (rising or ahead):
+                break
+            j += 1
+            if base_s + j + PeakWindow > L:
+                break
+    Peak_smoothed = base_s + j - 1
+
+    # 终点
+    p = 1
+    if EndWindow > 1 and Peak_smoothed + p + EndWindow <= L:
+        while True:
+            w0 = Peak_smoothed + p
+            w1 = Peak_smoothed + EndWindow + p
+            window_max = xs[w0]
+            for i in range(w0 + 1, w1):
+                if xs[i] > window_max:
+                    window_max = xs[i]
+            if not (window_max > high * baseline_std and (xs[w1 - 1] - xs[w0]) / (w1 - w0 - 1) < 0):
+                break
+            p += 1
+            if Peak_smoothed + EndWindow + p > L:
+                break
+    EndDetected_smoothed = Peak_smoothed + p + 1
+    tail_stop = min(EndDetected_smoothed + EndWindow, L)
+    if tail_stop > EndDetected_smoothed:
+        ind = EndDetected_smoothed
+        for i in range(EndDetected_smoothed + 1, tail_stop):
+            if x[i] < x[ind]:
+                ind = i
+        EndDetected = ind + 1
+    else:
+        EndDetected = L
+    next_s = max(EndDetected - B, s + 1)
+
+    # 衰减段均值过低时不记录该事件
+    decay_stop = min(PeakDetected + DecayPoint, L)
+    decay_mean = 0.0
+    for i in range(PeakDetected - 1, decay_stop):
+        decay_mean += x[i]
+    decay_mean /= decay_stop - PeakDetected + 1
+    if decay_mean < rate * baseline_std:
+        return False, OnsetDetected, PeakDetected, EndDetected, next_s
+
+    # 用残差替换事件段
+    end_value = x[EndDetected - 1]
+    if EndDetected - OnsetDetected + 1 >= B:
+        lo = OnsetDetected - 1
+    else:
+        lo = max(EndDetected - B, 0)
+    for i in range(lo, EndDetected):
+        x[i] = residual[i] + end_value
+    return True, OnsetDetected, PeakDetected, EndDetected, next_s
+
+
+if numba is not None:
+    _walk_event_jit = numba.njit(cache=True)(_walk_event_kernel)
+else:
+    _walk_event_jit = None
+
+
+def _walk_event(x, xs, xs_csum, residual, s, max_test_point, baseline_std, w, high, rate, jit=True):
+    """有 numba 且 jit 为真时使用编译内核，否则使用 NumPy 实现。"""
+    if not jit or _walk_event_jit is None:
+        return _walk_event_numpy(x, xs, xs_csum, residual, s, max_test_point, baseline_std, w, high, rate)
+    return _walk_event_jit(x, xs, xs_csum, residual, int(s), int(max_test_point), float(baseline_std),
+                           w['BaselineWindow'], w['PredictWindow'], w['PeakPoint'], w['PeakWindow'],
+                           w['EndWindow'], w['DecayPoint'], float(high), float(rate))
+
+
+def detect_cell(data_of_single_cell, parameters, jit=True):
+    """
+    对单个神经元的信号检测钙瞬态。jit 为假时不使用 numba 内核。
+
+    返回 (Onset, Peak, End, ThresholdValue)，前三者为 0 起始的索引数组，
+    ThresholdValue 为 3 x k 数组（TestValue; MaxDifference; BaselineSTD）。
+    """
+    w = window_lengths(parameters)
+    high = parameters['HighThreshold']
+    rate = parameters['LowThreshold']
+    B = w['BaselineWindow']
+    P = w['PredictWindow']
+
+    x = np.array(data_of_single_cell, dtype=np.float64)
+    xs = movmean(x, w['LPFvalue'])
+    xs_csum = np.concatenate([[0.0], np.cumsum(xs)])
+    residual = x - xs
+    L = len(x)
+    s_max = L - B - P  # 最后一个可用起点（0 起始）
+
+    onsets, peaks, ends, thresholds = [], [], [], []
+    s = 0
+    block = None
+    block_start = block_stop = 0
+    block_len = SCAN_BLOCK_MIN
+    while s <= s_max:
+        if block is None or not (block_start <= s < block_stop):
+            block_start = s
+            block_stop = min(s + block_len, s_max + 1)
+            block = scan_criteria(x, block_start, block_stop, w, high, rate)
+        hits = np.flatnonzero(block['passed'][s - block_start:])
+        if len(hits) == 0:
+            s = block_stop
+            block_len = min(2 * block_len, SCAN_BLOCK_MAX)
+            continue
+        s += hits[0]
+        k = s - block_start
+        baseline_std = block['BaselineSTD'][k]
+        thresholds.append((block['TestValue'][k], block['MaxDifference'][k], baseline_std))
+        recorded, onset, peak, end, s = _walk_event(x, xs, xs_csum, residual, s, block['MaxTestPoint'][k],
+                                                    baseline_std, w, high, rate, jit=jit)
+        if recorded:
+            onsets.append(onset - 1)
+            peaks.append(peak - 1)
+            ends.append(end - 1)
+            # 信号已被修改，后续起点需要重新计算
+            block = None
+            block_len = SCAN_BLOCK_MIN
+
+    return (np.asarray(onsets, dtype=np.int64), np.asarray(peaks, dtype=np.int64),
+            np.asarray(ends, dtype=np.int64), np.asarray(thresholds, dtype=np.float64).reshape(-1, 3).T)
+
+
+def _nanmean(v):
+    """与 MATLAB mean 相同：空数组的均值为 NaN（不发出警告）。"""
+    return v.mean() if len(v) else np.nan
+
+
+def detect_cell_loop(data_of_single_cell, parameters):
+    """
+    与 MATLAB TransientDetection 逐行对应的直接循环实现。
+
+    每个起点做 polyfit、mean、std，事件的起点/峰值/终点查找也按 MATLAB 代码
+    逐行转写（1 起始下标），不与 detect_cell 共用任何检测代码，因此可以独立
+    校验 detect_cell 的向量化判断标准与逐点查找。速度很慢，仅用于校验与性能
+    对比，返回值与 detect_cell 相同。
+
+    与 MATLAB 唯一的差别：终点不在起点之后时强制前进一个起点（MATLAB 版本在
+    这种情况下不会终止），与 detect_cell 一致。
+    """
+    w = window_lengths(parameters)
+    HighThresholdFactor = parameters['HighThreshold']
+    RateThreshold = parameters['LowThreshold']
+    BaselineWindow = w['BaselineWindow']
+    PredictWindow = w['PredictWindow']
+    PeakAfterPoint = w['PeakAfterPoint']
+    PeakPrePoint = w['PeakPrePoint']
+    EndWindow = w['EndWindow']
+    PeakWindow = w['PeakWindow']
+    PeakPoint = w['PeakPoint']
+    DecayPoint = w['DecayPoint']
+
+    data = np.array(data_of_single_cell, dtype=np.float64)
+    smoothed = movmean(data, w['LPFvalue'])
+    residual = data - smoothed
+    L = len(data)
+
+    def seg(v, a, b):
+        """MATLAB 的 v(a:b)。"""
+        return v[a - 1:b]
+
+    onsets, peaks, ends, thresholds = [], [], [], []
+    t = np.arange(1, BaselineWindow + 1)
+    sample_index = 1
+    while sample_index <= L - (BaselineWindow + PredictWindow) + 1:
+        test_start = sample_index + BaselineWindow
+        TestData = seg(data, test_start, test_start + PredictWindow - 1)
+        DataOfBaseline = seg(data, sample_index, sample_index + BaselineWindow - 1)
+        TestDataSmoothed = seg(smoothed, test_start, test_start + PredictWindow - 1)
+        DataOfBaselineSmoothed = seg(smoothed, sample_index, sample_index + BaselineWindow - 1)
+        cofactor = np.polyfit(t, DataOfBaseline, 1)
+        BaselineCorrection = t * cofactor[0] + cofactor[1]
+        DataOfBaseline_corrected = DataOfBaseline - BaselineCorrection + BaselineCorrection.mean()
+        TestDataCorrected = TestData - DataOfBaseline.mean()
+        TestDataCorrectedSmoothed = TestDataSmoothed - DataOfBaselineSmoothed.mean()
+        MaxTestPoint = int(np.argmax(TestDataCorrected)) + 1
+        n_test = len(TestDataCorrected)
+        if MaxTestPoint > PeakPrePoint and MaxTestPoint <= n_test - PeakAfterPoint:
+            TestValue = seg(TestDataCorrected, MaxTestPoint - PeakPrePoint, MaxTestPoint + PeakAfterPoint).mean()
+        elif MaxTestPoint > PeakPrePoint:
+            TestValue = seg(TestDataCorrected, MaxTestPoint - PeakPrePoint, n_test).mean()
+        elif MaxTestPoint <= n_test - PeakAfterPoint:
+            TestValue = seg(TestDataCorrected, 1, MaxTestPoint + PeakAfterPoint).mean()
+        else:
+            TestValue = TestDataCorrected.mean()
+        BaselineSTD = np.std(DataOfBaseline_corrected, ddof=1)
+        Criterion1 = TestValue > HighThresholdFactor * BaselineSTD
+        MaxDifference = np.max(np.diff(TestDataCorrected)) if n_test > 1 else np.nan
+        Criterion2 = MaxDifference > RateThreshold * BaselineSTD
+        MaxSmoothedPoint = int(np.argmax(TestDataCorrectedSmoothed)) + 1
+        MaxPoint = MaxTestPoint
+        if not (Criterion1 and Criterion2):
+            sample_index += 1
+            continue
+        thresholds.append((TestValue, MaxDifference, BaselineSTD))
+
+        # 定位起始点
+        DataCombined = TestDataCorrected
+        if len(DataCombined) > 1:
+            fast_point_first = np.flatnonzero(np.diff(DataCombined) > RateThreshold * BaselineSTD) + 1
+            fast_point = fast_point_first[0]
+            for fp in range(len(fast_point_first) - 1):
+                a = fast_point_first[fp]
+                b = fast_point_first[fp + 1]
+                if seg(DataCombined, a + 1, a + 1)[0] < seg(DataCombined, b + 1, b + 1)[0] and b - a > 1 and \
+                        seg(DataCombined, a + 2, a + 2)[0] < seg(DataCombined, a + 1, a + 1)[0]:
+                    fast_point = b
+                    break
+            OnsetDetected = sample_index - 1 + BaselineWindow + fast_point
+        else:
+            OnsetDetected = sample_index - 1 + BaselineWindow
+
+        # 峰值
+        base = BaselineWindow + sample_index - 1 + MaxPoint
+        n = 1
+        if base + n + PeakPoint <= L:
+            while (_nanmean(seg(data, base + n, base + n + PeakPoint - 1))
+                   - seg(data, base + n - 1, base + n - 1)[0]) > 0:
+                n += 1
+                if base + n + PeakPoint > L:
+                    break
+        PeakDetected = base + n - 1
+
+        # 平滑信号上的峰值
+        base_s = BaselineWindow + sample_index - 1 + MaxSmoothedPoint
+        j = 1
+        if base_s + j + PeakWindow <= L:
+            while (seg(smoothed, base_s + j, base_s + j)[0] - seg(smoothed, base_s + j - 1, base_s + j - 1)[0] > 0 or
+                   (seg(smoothed, base_s + j, base_s + j + PeakWindow).mean()
+                    - seg(smoothed, base_s + j, base_s + j)[0]) > 0):
+                j += 1
+                if base_s + j + PeakWindow > L:
+                    break
+        Peak_smoothed = base_s + j - 1
+
+        # 终点
+        p = 1
+        if Peak_smoothed + p + EndWindow <= L:
+            while True:
+                window = seg(smoothed, Peak_smoothed + p + 1, Peak_smoothed + EndWindow + p)
+                if not (window.max() > HighThresholdFactor * BaselineSTD and _nanmean(np.diff(window)) < 0):
+                    break
+                p += 1
+                if Peak_smoothed + EndWindow + p > L:
+                    break
+        EndDetected_smoothed = Peak_smoothed + p + 1
+        if EndDetected_smoothed + EndWindow <= L:
+            tail = seg(data, EndDetected_smoothed + 1, EndDetected_smoothed + EndWindow)
+        else:
+            tail = seg(data, EndDetected_smoothed + 1, L)
+        EndDetected = EndDetected_smoothed + int(np.argmin(tail)) + 1 if len(tail) else L
+        next_sample_index = max(EndDetected - BaselineWindow + 1, sample_index + 1)
+
+        if PeakDetected + DecayPoint > L:
+            DecayValue = seg(data, PeakDetected, L)
+        else:
+            DecayValue = seg(data, PeakDetected, PeakDetected + DecayPoint)
+        if DecayValue.mean() < RateThreshold * BaselineSTD:
+            sample_index = next_sample_index
+            continue
+
+        end_value = data[EndDetected - 1]
+        if EndDetected - OnsetDetected + 1 >= BaselineWindow:
+            data[OnsetDetected - 1:EndDetected] = seg(residual, OnsetDetected, EndDetected) + end_value
+        else:
+            lo = max(EndDetected - BaselineWindow + 1, 1)
+            data[lo - 1:EndDetected] = seg(residual, lo, EndDetected) + end_value
+        onsets.append(OnsetDetected - 1)
+        peaks.append(PeakDetected - 1)
+        ends.append(EndDetected - 1)
+        sample_index = next_sample_index
+
+    return (np.asarray(onsets, dtype=np.int64), np.asarray(peaks, dtype=np.int64),
+            np.asarray(ends, dtype=np.int64), np.asarray(thresholds, dtype=np.float64).reshape(-1, 3).T)
+
+
+def benchmark(calcium_data, parameters, n_cells=4):
+    """
+    在前 n_cells 个神经元上比较直接循环、NumPy 与 numba 实现的耗时，并检查结果一致。
+
+    返回 {实现名称: 秒数}，一致性结果以 'identical' 键给出。
+    """
+    cells = np.atleast_2d(calcium_data)[:n_cells]
+    runs = {'loop': lambda c: detect_cell_loop(c, parameters),
+            'numpy': lambda c: detect_cell(c, parameters, jit=False)}
+    if _walk_event_jit is not None:
+        detect_cell(cells[0], parameters)  # 预先编译
+        runs['numba'] = lambda c: detect_cell(c, parameters)
+
+    timings = {}
+    outputs = {}
+    for name, run in runs.items():
+        t0 = time.perf_counter()
+        outputs[name] = [run(cell)[:3] for cell in cells]
+        timings[name] = time.perf_counter() - t0
+    reference = outputs['loop']
+    timings['identical'] = all(np.array_equal(a, b)
+                               for result in outputs.values()
+                               for cell_a, cell_b in zip(reference, result)
+                               for a, b in zip(cell_a, cell_b))
+    return timings
+
+
+def _init_worker(shm_name, shape, dtype):
+    global _shared, _shared_data
+    _shared = shared_memory.SharedMemory(name=shm_name)
+    _shared_data = np.ndarray(shape, dtype=dtype, buffer=_shared.buf)
+
+
+def _detect_shard(cell_indices, parameters):
+    """在工作进程中检测一组神经元，数据来自共享内存。"""
+    return [(cell_index,) + detect_cell(_shared_data[cell_index], parameters) for cell_index in cell_indices]
+
+
+def _detect_parallel(calcium_data, parameters, workers):
+    """把神经元分片交给进程池，返回按神经元顺序排列的 detect_cell 结果。"""
+    n_cells = calcium_data.shape[0]
+    n_shards = min(n_cells, workers * SHARDS_PER_WORKER)
+    shards = [s for s in np.array_split(np.arange(n_cells), n_shards) if len(s)]
+
+    shm = shared_memory.SharedMemory(create=True, size=max(calcium_data.nbytes, 1))
+    try:
+        shared = np.ndarray(calcium_data.shape, dtype=calcium_data.dtype, buffer=shm.buf)
+        shared[:] = calcium_data
+        results = [None] * n_cells
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(shm.name, calcium_data.shape, calcium_data.dtype)) as executor:
+            futures = [executor.submit(_detect_shard, shard.tolist(), parameters) for shard in shards]
+            for future in as_completed(futures):
+                for cell_index, *result in future.result():
+                    results[cell_index] = result
+        del shared
+    finally:
+        shm.close()
+        shm.unlink()
+    return results
+
+
+def transient_detection(calcium_data, parameters=None, workers=1):
+    """
+    对 (神经元, 采样点) 矩阵中的每个神经元检测钙瞬态，输出结构与 MATLAB 版本相同：
+    'OnsetDetectionResult'、'PeakDetectionResult'、'EndDetectionResult'、
+    'ThresholdValue'（仅 UseDetection 时）与 'DetectionNeeded'。
+
+    workers > 1 时使用多进程并行检测，workers 为 None 时使用全部 CPU 核。
+    """
+    if parameters is None:
+        parameters = DEFAULT_PARAMETERS
+    calcium_data = np.ascontiguousarray(np.atleast_2d(calcium_data), dtype=np.float64)
+    n_cells = calcium_data.shape[0]
+    detected = {
+        'OnsetDetectionResult': [np.empty(0, dtype=np.int64) for _ in range(n_cells)],
+        'PeakDetectionResult': [np.empty(0, dtype=np.int64) for _ in range(n_cells)],
+        'EndDetectionResult': [np.empty(0, dtype=np.int64) for _ in range(n_cells)],
+    }
+    if not parameters['UseDetection']:
+        detected['DetectionNeeded'] = 1
+        return detected
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers > 1 and n_cells > 1:
+        results = _detect_parallel(calcium_data, parameters, min(workers, n_cells))
+    else:
+        results = [detect_cell(calcium_data[cell_index], parameters) for cell_index in range(n_cells)]
+
+    detected['ThresholdValue'] = []
+    for cell_index, (onset, peak, end, threshold) in enumerate(results):
+        detected['OnsetDetectionResult'][cell_index] = onset
+        detected['PeakDetectionResult'][cell_index] = peak
+        detected['EndDetectionResult'][cell_index] = end
+        detected['ThresholdValue'].append(threshold)
+    detected['DetectionNeeded'] = 0
+    return detected
+
+
+def read_matlab_fixture(folder):
+    """
+    读取 Signalprocessing.m 中 ExportDetectedEvents 格式的检测结果。
+
+    onset.txt/peak.txt/end.txt 每行对应一个神经元，为 1 起始的索引，
+    返回与 transient_detection 相同结构（0 起始）的字典。
+    """
+    detected = {}
+    for key, file_name in (('OnsetDetectionResult', 'onset.txt'),
+                           ('PeakDetectionResult', 'peak.txt'),
+                           ('EndDetectionResult', 'end.txt')):
+        with open(os.path.join(folder, file_name), 'r') as f:
+            detected[key] = [np.array(line.split(), dtype=np.float64).astype(np.int64) - 1 for line in f]
+    return detected
+
+
+def compare_detection(detected, reference):
+    """逐个神经元比较检测结果，返回不一致的 (字段, 神经元索引) 列表。"""
+    mismatches = []
+    for key in ('OnsetDetectionResult', 'PeakDetectionResult', 'EndDetectionResult'):
+        for cell_index, (a, b) in enumerate(zip(detected[key], reference[key])):
+            if not np.array_equal(a, b):
+                mismatches.append((key, cell_index))
+        if len(detected[key]) != len(reference[key]):
+            mismatches.append((key, 'cell count'))
+    return mismatches
+
+
+def load_calcium_data(path):
+    """读取荧光数据并转为 (神经元, 采样点)，与 MATLAB 脚本相同：行数多于列数时转置。"""
+    data = np.loadtxt(path, ndmin=2)
+    if data.shape[0] > data.shape[1]:
+        data = data.T
+    return np.ascontiguousarray(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='钙瞬态事件检测')
+    parser.add_argument('data_path', type=str, help='荧光数据 txt 文件')
+    parser.add_argument('--sampling_rate', default=DEFAULT_PARAMETERS['SamplingRate'], type=float)
+    parser.add_argument('--high_threshold', default=DEFAULT_PARAMETERS['HighThreshold'], type=float)
+    parser.add_argument('--low_threshold', default=DEFAULT_PARAMETERS['LowThreshold'], type=float)
+    parser.add_argument('--prediction_length', default=DEFAULT_PARAMETERS['PredictionLength'], type=float)
+    parser.add_argument('--baseline_length', default=DEFAULT_PARAMETERS['BaselineLength'], type=float)
+    parser.add_argument('--lp_factor', default=DEFAULT_PARAMETERS['LPfactor'], type=float)
+    parser.add_argument('--baseline_correction', action='store_true',
+                        help='检测前扣除滑动中值基线（窗口为 baseline_length，与 MATLAB 脚本相同）')
+    parser.add_argument('--approx_baseline', action='store_true', help='基线校正使用近似的分块分位数基线')
+    parser.add_argument('--compare', default='', type=str,
+                        help='参考结果所在目录（ExportDetectedEvents 格式的 onset/peak/end.txt），'
+                             'fixtures/transient 中为 detect_cell_loop 的结果')
+    parser.add_argument('--workers', default=1, type=int, help='并行进程数，0 表示使用全部 CPU 核')
+    parser.add_argument('--benchmark', default=0, type=int, help='在前 N 个神经元上与直接循环实现比较耗时')
+    arg = parser.parse_args()
+
+    parameters = dict(DEFAULT_PARAMETERS,
+                      SamplingRate=arg.sampling_rate,
+                      HighThreshold=arg.high_threshold,
+                      LowThreshold=arg.low_threshold,
+                      PredictionLength=arg.prediction_length,
+                      BaselineLength=arg.baseline_length,
+                      LPfactor=arg.lp_factor)
+    calcium_data = load_calcium_data(arg.data_path)
+    if arg.baseline_correction or arg.approx_baseline:
+        window_size = int(np.floor(parameters['BaselineLength'] * parameters['SamplingRate']))
+        calcium_data, _ = baseline.correct_baseline(calcium_data, window_size, approx=arg.approx_baseline)
+    if arg.benchmark:
+        timings = benchmark(calcium_data, parameters, n_cells=arg.benchmark)
+        identical = timings.pop('identical')
+        for name, seconds in timings.items():
+            print(f'{name:>6}: {seconds:.3f} s（{timings["loop"] / seconds:.1f}x）')
+        print('结果一致' if identical else '结果不一致')
+        return
+    detected = transient_detection(calcium_data, parameters, workers=arg.workers or None)
+    n_events = sum(len(onset) for onset in detected['OnsetDetectionResult'])
+    print(f'{calcium_data.shape[0]} 个神经元，共检测到 {n_events} 个事件')
+
+    if arg.compare:
+        mismatches = compare_detection(detected, read_matlab_fixture(arg.compare))
+        if mismatches:
+            raise SystemExit(f'与 {arg.compare} 中的参考结果不一致:\n{mismatches}')
+        print(f'与 {arg.compare} 中的参考结果一致')
+
+
+if __name__ == '__main__':
+    main()
@@ -2,6 +2,8 @@ import numpy as np
 import cv2
 import os
 
+import imgsize
+
 
 def get_image_size(image_path):
     """
@@ -11,10 +13,9 @@ def get_image_size(image_path):
     - image_path: 图像文件路径。
 
     返回:
-    - 图像大小（宽度，高度）。
+    - 图像大小（宽度，高度）。只读取文件头，不解码图像，见 imgsize。
     """
-    image = cv2.imread(image_path, cv2.IMREAD_UNCHANGED)
-    return (image.shape[1], image.shape[0])  # 返回宽度和高度
+    return imgsize.image_size(image_path)
 
 
 def txt_to_png(txt_file, output_png, image_size):
@@ -75,21 +76,25 @@ def batch_convert_txt_to_png(input_txt_folder, input_image_folder, output_folder
     if not os.path.exists(output_folder):
         os.makedirs(output_folder)
 
+    # 一次取得所有对应图像的尺寸（读文件头并缓存在图像目录的索引中）
+    txt_files = [file_name for file_name in os.listdir(input_txt_folder) if file_name.endswith('.txt')]
+    image_sizes = imgsize.directory_sizes(input_image_folder,
+                                          [file_name.replace('.txt', '.png') for file_name in txt_files])
+
     # 遍历输入txt文件夹中的所有txt文件
-    for file_name in os.listdir(input_txt_folder):
-        if file_name.endswith('.txt'):
-            txt_path = os.path.join(input_txt_folder, file_name)
-            image_name = file_name.replace('.txt', '.png')  # 假设图像格式为png
-            image_path = os.path.join(input_image_folder, image_name)
-
-            # 检查对应图像是否存在
-            if os.path.exists(image_path):
-                image_size = get_image_size(image_path)
-                png_path = os.path.join(output_folder, image_name)
-                txt_to_png(txt_path, png_path, image_size)
-                print(f"已转换: {txt_path} -> {png_path}")
-            else:
-                print(f"未找到对应图像: {image_path}")
+    for file_name in txt_files:
+        txt_path = os.path.join(input_txt_folder, file_name)
+        image_name = file_name.replace('.txt', '.png')  # 假设图像格式为png
+        image_path = os.path.join(input_image_folder, image_name)
+
+        # 检查对应图像是否存在
+        if image_name in image_sizes:
+            image_size = image_sizes[image_name]
+            png_path = os.path.join(output_folder, image_name)
+            txt_to_png(txt_path, png_path, image_size)
+            print(f"已转换: {txt_path} -> {png_path}")
+        else:
+            print(f"未找到对应图像: {image_path}")
 
 
 
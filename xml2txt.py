@@ -1,10 +1,25 @@
+"""
+VOC 格式标注（xml）转换为 YOLO 格式（txt）。
+
+先并行扫描所有 xml 得到按名称排序的类别表（或由 --classes 指定），保证类别
+编号与文件顺序、进程调度无关；再在进程池中逐个转换。图像宽高优先取 xml 的
+<size>，缺失时只读图像文件头（见 imgsize），不解码像素。转换失败的文件写入
+失败报告 CSV。
+
+示例:
+    python xml2txt.py --xml_path VOCdevkit/Annotations --img_path VOCdevkit/JPEGImages --workers 8
+"""
+import argparse
+import csv
+import os
+import time
 import xml.etree.ElementTree as ET
-import os, cv2
-import numpy as np
-from os import listdir
-from os.path import join
+from concurrent.futures import ProcessPoolExecutor
+
+from imgsize import image_size
+
+CHUNK_SIZE = 256  # 每次分发给子进程的文件数
 
-classes = []
 
 def convert(size, box):
     dw = 1. / (size[0])
@@ -20,53 +35,141 @@ def convert(size, box):
     return (x, y, w, h)
 
 
-def convert_annotation(xmlpath, xmlname):
-    with open(xmlpath, "r", encoding='utf-8') as in_file:
-        txtname = xmlname[:-4] + '.txt'
-        txtfile = os.path.join(txtpath, txtname)
-        tree = ET.parse(in_file)
-        root = tree.getroot()
-        filename = root.find('filename')
-        img = cv2.imdecode(np.fromfile('{}/{}.{}'.format(imgpath, xmlname[:-4], postfix), np.uint8), cv2.IMREAD_COLOR)
-        h, w = img.shape[:2]
-        res = []
-        for obj in root.iter('object'):
-            cls = obj.find('name').text
-            if cls not in classes:
-                classes.append(cls)
-            cls_id = classes.index(cls)
-            xmlbox = obj.find('bndbox')
-            b = (float(xmlbox.find('xmin').text), float(xmlbox.find('xmax').text), float(xmlbox.find('ymin').text),
-                 float(xmlbox.find('ymax').text))
-            bb = convert((w, h), b)
-            res.append(str(cls_id) + " " + " ".join([str(a) for a in bb]))
-        if len(res) != 0:
-            with open(txtfile, 'w+') as f:
-                f.write('\n'.join(res))
+def read_size(root):
+    """从 xml 的 <size> 读取 (宽, 高)，缺失或为 0 时返回 None。"""
+    size = root.find('size')
+    if size is None:
+        return None
+    try:
+        w = int(float(size.find('width').text))
+        h = int(float(size.find('height').text))
+    except (AttributeError, TypeError, ValueError):
+        return None
+    if w <= 0 or h <= 0:
+        return None
+    return w, h
+
+
+def scan_classes(xml_file):
+    """返回 xml 中出现的类别名集合。"""
+    root = ET.parse(xml_file).getroot()
+    return {obj.find('name').text for obj in root.iter('object')}
+
+
+def _scan_job(xml_file):
+    try:
+        return xml_file, scan_classes(xml_file), ''
+    except Exception as e:
+        return xml_file, set(), str(e)
+
+
+def convert_annotation(xml_file, txt_file, img_file, class_map):
+    """
+    转换一个 xml 文件，返回写入的目标数；没有目标时不生成 txt。
+
+    class_map 为类别名到编号的字典，出现未知类别时抛出 KeyError。
+    """
+    root = ET.parse(xml_file).getroot()
+    objects = list(root.iter('object'))
+    if not objects:
+        return 0
+    size = read_size(root)
+    if size is None:
+        size = image_size(img_file)
+    res = []
+    for obj in objects:
+        cls = obj.find('name').text
+        if cls not in class_map:
+            raise KeyError(f'未知类别: {cls}')
+        cls_id = class_map[cls]
+        xmlbox = obj.find('bndbox')
+        b = (float(xmlbox.find('xmin').text), float(xmlbox.find('xmax').text), float(xmlbox.find('ymin').text),
+             float(xmlbox.find('ymax').text))
+        bb = convert(size, b)
+        res.append(str(cls_id) + " " + " ".join([str(a) for a in bb]))
+    with open(txt_file, 'w') as f:
+        f.write('\n'.join(res))
+    return len(res)
+
+
+def _convert_job(job):
+    xml_name, xml_file, txt_file, img_file, class_map = job
+    try:
+        return xml_name, convert_annotation(xml_file, txt_file, img_file, class_map), ''
+    except Exception as e:
+        return xml_name, 0, str(e)
+
+
+def read_class_file(path):
+    """每行一个类别名，行号（从 0 开始）即类别编号。"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='VOC xml 标注转换为 YOLO txt')
+    parser.add_argument('--xml_path', default='VOCdevkit/Annotations', type=str, help='xml 标注目录')
+    parser.add_argument('--img_path', default='VOCdevkit/JPEGImages', type=str, help='图像目录')
+    parser.add_argument('--txt_path', default='VOCdevkit/txt', type=str, help='txt 输出目录')
+    parser.add_argument('--postfix', default='jpg', type=str, help='图像后缀')
+    parser.add_argument('--classes', default=None, type=str,
+                        help='类别文件（每行一个类别），不指定时扫描所有 xml 并按名称排序')
+    parser.add_argument('--classes_out', default='VOCdevkit/classes.txt', type=str, help='写出类别表的文件')
+    parser.add_argument('--report', default='VOCdevkit/convert_failures.csv', type=str, help='失败报告 CSV')
+    parser.add_argument('--workers', default=None, type=int, help='进程数，默认为 CPU 核数')
+    arg = parser.parse_args()
+
+    os.makedirs(arg.txt_path, exist_ok=True)
+    xml_names = sorted(name for name in os.listdir(arg.xml_path) if name.lower().endswith('.xml'))
+    failures = {}
+    start_time = time.time()
+
+    with ProcessPoolExecutor(max_workers=arg.workers) as executor:
+        if arg.classes:
+            classes = read_class_file(arg.classes)
+        else:
+            # 预扫描类别：合并所有文件中的类别名后排序
+            names = set()
+            xml_files = [os.path.join(arg.xml_path, name) for name in xml_names]
+            for xml_name, (_, found, error) in zip(xml_names, executor.map(_scan_job, xml_files,
+                                                                           chunksize=CHUNK_SIZE)):
+                if error:
+                    failures[xml_name] = error
+                names |= found
+            classes = sorted(names)
+        class_map = {cls: i for i, cls in enumerate(classes)}
+
+        jobs = [(name, os.path.join(arg.xml_path, name),
+                 os.path.join(arg.txt_path, name[:-4] + '.txt'),
+                 os.path.join(arg.img_path, f'{name[:-4]}.{arg.postfix}'),
+                 class_map)
+                for name in xml_names if name not in failures]
+        n_objects = 0
+        for xml_name, count, error in executor.map(_convert_job, jobs, chunksize=CHUNK_SIZE):
+            if error:
+                failures[xml_name] = error
+            n_objects += count
+
+    if arg.classes_out:
+        os.makedirs(os.path.dirname(os.path.abspath(arg.classes_out)), exist_ok=True)
+        with open(arg.classes_out, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(classes))
+    if failures:
+        os.makedirs(os.path.dirname(os.path.abspath(arg.report)), exist_ok=True)
+        with open(arg.report, 'w', encoding='utf-8-sig', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['file', 'error'])
+            for xml_name in sorted(failures):
+                writer.writerow([xml_name, failures[xml_name]])
+    elif os.path.exists(arg.report):
+        os.remove(arg.report)  # 删除上次运行留下的失败报告
+
+    print(f'共 {len(xml_names)} 个 xml，成功 {len(xml_names) - len(failures)} 个，'
+          f'目标 {n_objects} 个，用时 {time.time() - start_time:.1f} 秒')
+    if failures:
+        print(f'this file convert failure: {len(failures)} 个，详见 {arg.report}')
+    print(f'Dataset Classes:{classes}')
 
 
 if __name__ == "__main__":
-    postfix = 'jpg'
-    imgpath = 'VOCdevkit/JPEGImages'
-    xmlpath = 'VOCdevkit/Annotations'
-    txtpath = 'VOCdevkit/txt'
-    
-    if not os.path.exists(txtpath):
-        os.makedirs(txtpath, exist_ok=True)
-    
-    list = os.listdir(xmlpath)
-    error_file_list = []
-    for i in range(0, len(list)):
-        try:
-            path = os.path.join(xmlpath, list[i])
-            if ('.xml' in path) or ('.XML' in path):
-                convert_annotation(path, list[i])
-                print(f'file {list[i]} convert success.')
-            else:
-                print(f'file {list[i]} is not xml format.')
-        except Exception as e:
-            print(f'file {list[i]} convert error.')
-            print(f'error message:\n{e}')
-            error_file_list.append(list[i])
-    print(f'this file convert failure\n{error_file_list}')
-    print(f'Dataset Classes:{classes}')
\ No newline at end of file
+    main()
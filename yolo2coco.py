@@ -1,89 +1,212 @@
+"""
+YOLO 格式标签（txt）转换为 COCO 格式（json）。
+
+只处理有标签文件的图像，宽高只读取图像文件头（见 imgsize）。标签文件分块
+在进程池中解析，主进程按图像顺序编号，images 数组直接写入输出文件，
+annotations 数组先写入临时文件，最后拼接到输出文件末尾，内存占用与标注
+数量无关。--split 时用 train_test_split 划分为 train/val/test 三个 json。
+
+示例:
+    python yolo2coco.py --image_path images --label_path labels --save_path data.json --split
+"""
 import os
-import cv2
 import json
+import shutil
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from tqdm import tqdm
-from sklearn.model_selection import train_test_split
 import argparse
 
+import imgsize
+
+try:
+    from sklearn.model_selection import train_test_split
+except ImportError:
+    train_test_split = None
+
 # visdrone2019
 classes = ['pedestrain', 'people', 'bicycle', 'car', 'van', 'truck', 'tricycle', 'awning-tricycle', 'bus', 'motor']
 
-parser = argparse.ArgumentParser()
-parser.add_argument('--image_path', default='',type=str, help="path of images")
-parser.add_argument('--label_path', default='',type=str, help="path of labels .txt")
-parser.add_argument('--save_path', default='data.json', type=str, help="if not split the dataset, give a path to a json file")
-arg = parser.parse_args()
+CHUNK_SIZE = 256  # 每个子进程任务解析的标签文件数
+PENDING_PER_WORKER = 2  # 每个进程最多排队的分块数，限制尚未写出的解析结果
+
+
+def parse_labels(label_file, width, height, stem):
+    """
+    解析一个 YOLO 标签文件，返回不含 id 的标注 json 片段列表（以逗号开头、'}' 结尾），
+    由主进程在前面补上 '{"id": n'。少于 5 列的行被跳过。
+    """
+    bodies = []
+    with open(label_file, 'r') as fr:
+        for label in fr:
+            label = label.strip().split()
+            if len(label) < 5:
+                continue
+            x = float(label[1])
+            y = float(label[2])
+            w = float(label[3])
+            h = float(label[4])
+
+            # convert x,y,w,h to x1,y1,x2,y2
+            x1 = (x - w / 2) * width
+            y1 = (y - h / 2) * height
+            x2 = (x + w / 2) * width
+            y2 = (y + h / 2) * height
+            # 标签序号从0开始计算, coco2017数据集标号混乱，不管它了。
+            cls_id = int(label[0])
+            box_w = max(0, x2 - x1)
+            box_h = max(0, y2 - y1)
+            annotation = json.dumps({
+                'area': box_w * box_h,
+                'bbox': [x1, y1, box_w, box_h],
+                'category_id': cls_id,
+                'image_id': stem,
+                'iscrowd': 0,
+                # mask, 矩形是从左上角点按顺时针的四个顶点
+                'segmentation': [[x1, y1, x2, y1, x2, y2, x1, y2]]
+            })
+            bodies.append(', ' + annotation[1:])
+    return bodies
+
+
+def _parse_chunk(chunk):
+    results = []
+    for label_file, width, height, stem in chunk:
+        try:
+            results.append((parse_labels(label_file, width, height, stem), ''))
+        except Exception as e:
+            results.append(([], str(e)))
+    return results
+
+
+def labelled_images(image_dir, label_dir):
+    """返回有同名标签文件的图像文件名（排序）。"""
+    label_stems = {os.path.splitext(name)[0] for name in os.listdir(label_dir) if name.endswith('.txt')}
+    images = sorted(name for name in os.listdir(image_dir)
+                    if name.lower().endswith(imgsize.IMAGE_SUFFIXES) and os.path.splitext(name)[0] in label_stems)
+    return images
+
+
+def _ordered_results(executor, fn, items, max_pending):
+    """与 executor.map 相同按顺序返回结果，但最多只有 max_pending 个任务已提交而未取走。"""
+    items = iter(items)
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= max_pending:
+            break
+    while pending:
+        result = pending.popleft().result()
+        for item in items:
+            pending.append(executor.submit(fn, item))
+            break
+        yield result
+
+
+def write_coco(save_path, image_names, image_dir, label_dir, image_sizes, executor, max_pending):
+    """
+    流式写出一个 COCO json，返回 (图像数, 标注数, 失败文件列表)。
+
+    标签分块解析时最多 max_pending 个分块在排队或等待写出，内存占用与数据集
+    大小无关。先写入 save_path.tmp，完成后替换 save_path。
+    """
+    categories = [{'id': i, 'name': cls, 'supercategory': 'mark'} for i, cls in enumerate(classes, 0)]
+    error_file_list = []
+    jobs = []
+    for index in image_names:
+        if index not in image_sizes:
+            print(f'{os.path.join(image_dir, index)} read error.')
+            error_file_list.append(index)
+            continue
+        stem = index[:index.rfind(".")]
+        width, height = image_sizes[index]
+        jobs.append((index, os.path.join(label_dir, f'{stem}.txt'), width, height, stem))
+    chunks = [[job[1:] for job in jobs[i:i + CHUNK_SIZE]] for i in range(0, len(jobs), CHUNK_SIZE)]
+
+    save_dir = os.path.dirname(os.path.abspath(save_path))
+    os.makedirs(save_dir, exist_ok=True)
+    tmp_path = f'{save_path}.tmp'
+    n_images = 0
+    # 标注的id
+    ann_id_cnt = 0
+    with open(tmp_path, 'w') as f, tempfile.TemporaryFile('w+', dir=save_dir) as ann_file:
+        f.write('{"categories": ' + json.dumps(categories) + ', "images": [')
+        job_iter = iter(jobs)
+        for results in tqdm(_ordered_results(executor, _parse_chunk, chunks, max_pending), total=len(chunks)):
+            for bodies, error in results:
+                index, _, width, height, stem = next(job_iter)
+                if error:
+                    print(f'{os.path.join(label_dir, stem)}.txt read error.\nerror:{error}')
+                    error_file_list.append(index)
+                    continue
+                f.write((', ' if n_images else '') + json.dumps({'file_name': index,
+                                                                 'id': stem,
+                                                                 'width': width,
+                                                                 'height': height}))
+                n_images += 1
+                for body in bodies:
+                    ann_file.write((', ' if ann_id_cnt else '') + f'{{"id": {ann_id_cnt}' + body)
+                    ann_id_cnt += 1
+        f.write('], "annotations": [')
+        ann_file.seek(0)
+        shutil.copyfileobj(ann_file, f)
+        f.write(']}')
+    os.replace(tmp_path, save_path)
+    return n_images, ann_id_cnt, error_file_list
+
 
 def yolo2coco(arg):
     print("Loading data from ", arg.image_path, arg.label_path)
 
     assert os.path.exists(arg.image_path)
     assert os.path.exists(arg.label_path)
-    
-    originImagesDir = arg.image_path                                   
+
+    originImagesDir = arg.image_path
     originLabelsDir = arg.label_path
-    # images dir name
-    indexes = os.listdir(originImagesDir)
+    # 只保留有标签的图像，只读取这些图像的文件头
+    indexes = labelled_images(originImagesDir, originLabelsDir)
+    image_sizes = imgsize.directory_sizes(originImagesDir, indexes)
+
+    if arg.split:
+        if train_test_split is None:
+            raise ImportError('--split 需要安装 scikit-learn')
+        train_val, test = train_test_split(indexes, test_size=arg.test_size, random_state=arg.seed)
+        train, val = train_test_split(train_val, test_size=arg.val_size / (1 - arg.test_size),
+                                      random_state=arg.seed)
+        stem, ext = os.path.splitext(arg.save_path)
+        outputs = [(f'{stem}_{name}{ext or ".json"}', sorted(names))
+                   for name, names in (('train', train), ('val', val), ('test', test))]
+    else:
+        outputs = [(arg.save_path, indexes)]
+
+    max_pending = PENDING_PER_WORKER * (arg.workers or os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=arg.workers) as executor:
+        for save_path, names in outputs:
+            n_images, n_annotations, error_file_list = write_coco(save_path, names, originImagesDir,
+                                                                  originLabelsDir, image_sizes, executor,
+                                                                  max_pending)
+            print(f'Save annotation to {save_path} ({n_images} images, {n_annotations} annotations)')
+            if error_file_list:
+                print(f'this file convert failure\n{error_file_list}')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--image_path', default='', type=str, help="path of images")
+    parser.add_argument('--label_path', default='', type=str, help="path of labels .txt")
+    parser.add_argument('--save_path', default='data.json', type=str,
+                        help="if not split the dataset, give a path to a json file; "
+                             "with --split, <name>_train/_val/_test.json are written next to it")
+    parser.add_argument('--split', action='store_true',
+                        help="split the dataset into train/val/test with train_test_split")
+    parser.add_argument('--val_size', default=0.1, type=float, help="val ratio when --split")
+    parser.add_argument('--test_size', default=0.2, type=float, help="test ratio when --split")
+    parser.add_argument('--seed', default=0, type=int, help="random_state of train_test_split")
+    parser.add_argument('--workers', default=None, type=int, help="number of processes, default is the CPU count")
+    arg = parser.parse_args()
+    yolo2coco(arg)
 
-    dataset = {'categories': [], 'annotations': [], 'images': []}
-    for i, cls in enumerate(classes, 0):
-        dataset['categories'].append({'id': i, 'name': cls, 'supercategory': 'mark'})
-    
-    # 标注的id
-    ann_id_cnt = 0
-    for k, index in enumerate(tqdm(indexes)):
-        # 支持 png jpg 格式的图片.
-        txtFile = f'{index[:index.rfind(".")]}.txt'
-        stem = index[:index.rfind(".")]
-        # 读取图像的宽和高
-        try:
-            im = cv2.imread(os.path.join(originImagesDir, index))
-            height, width, _ = im.shape
-        except Exception as e:
-            print(f'{os.path.join(originImagesDir, index)} read error.\nerror:{e}')
-        # 添加图像的信息
-        if not os.path.exists(os.path.join(originLabelsDir, txtFile)):
-            # 如没标签，跳过，只保留图片信息.
-            continue
-        dataset['images'].append({'file_name': index,
-                            'id': stem,
-                            'width': width,
-                            'height': height})
-        with open(os.path.join(originLabelsDir, txtFile), 'r') as fr:
-            labelList = fr.readlines()
-            for label in labelList:
-                label = label.strip().split()
-                x = float(label[1])
-                y = float(label[2])
-                w = float(label[3])
-                h = float(label[4])
-
-                # convert x,y,w,h to x1,y1,x2,y2
-                H, W, _ = im.shape
-                x1 = (x - w / 2) * W
-                y1 = (y - h / 2) * H
-                x2 = (x + w / 2) * W
-                y2 = (y + h / 2) * H
-                # 标签序号从0开始计算, coco2017数据集标号混乱，不管它了。
-                cls_id = int(label[0])   
-                width = max(0, x2 - x1)
-                height = max(0, y2 - y1)
-                dataset['annotations'].append({
-                    'area': width * height,
-                    'bbox': [x1, y1, width, height],
-                    'category_id': cls_id,
-                    'id': ann_id_cnt,
-                    'image_id': stem,
-                    'iscrowd': 0,
-                    # mask, 矩形是从左上角点按顺时针的四个顶点
-                    'segmentation': [[x1, y1, x2, y1, x2, y2, x1, y2]]
-                })
-                ann_id_cnt += 1
-
-    # 保存结果
-    with open(arg.save_path, 'w') as f:
-        json.dump(dataset, f)
-        print('Save annotation to {}'.format(arg.save_path))
 
 if __name__ == "__main__":
-    yolo2coco(arg)
\ No newline at end of file
+    main()